@@ -0,0 +1,154 @@
+import argparse, contextlib, io, json, os, random, sys, time
+import multiprocessing as mp
+import numpy as np
+
+import homework
+from budget import Checkpoint, Deadline
+from cache import TourCache
+from distance import Distances
+from tsp_io import load_cities, sidecar_path
+
+# Seconds per instance when neither the command line nor the manifest gives a budget
+BATCH_BUDGET = 10.0
+
+def instance_size(filename):
+    ''' City count of an instance, read from the sidecar header or the first line of the text file '''
+    sidecar = sidecar_path(filename)
+    if os.path.exists(sidecar) and (not os.path.exists(filename) or os.path.getmtime(sidecar) >= os.path.getmtime(filename)):
+        return int(np.load(sidecar, mmap_mode="r").shape[0])
+    with open(filename, "r") as f:
+        first = f.readline().split()
+    return int(float(first[0])) if first else 0
+
+def read_manifest(filename):
+    '''
+    Instances listed in a manifest: one "path [budget]" line each, blank lines and "#" comments skipped.
+    Relative paths are taken from the manifest's directory.
+
+    :return: list of (path, budget or None).
+    '''
+    base = os.path.dirname(os.path.abspath(filename))
+    entries = []
+    with open(filename, "r") as f:
+        for line in f:
+            fields = line.split("#", 1)[0].split()
+            if not fields:
+                continue
+            path = fields[0] if os.path.isabs(fields[0]) else os.path.join(base, fields[0])
+            entries.append((path, float(fields[1]) if len(fields) > 1 else None))
+    return entries
+
+def list_instances(source):
+    '''
+    Instances of a batch: every .txt file of a directory, or the entries of a manifest file.
+
+    :return: list of (path, budget or None).
+    '''
+    if os.path.isdir(source):
+        names = sorted(name for name in os.listdir(source) if name.endswith(".txt"))
+        return [(os.path.join(source, name), None) for name in names]
+    return read_manifest(source)
+
+def plan_batch(entries, outDir, budget=BATCH_BUDGET):
+    '''
+    One task per instance, largest first so the long ones do not start last and hold up the batch.
+
+    :param outDir: directory receiving one tour file per instance, named like the instance.
+    :return: list of (path, output path, budget, cities) tuples.
+    '''
+    tasks = []
+    for path, ownBudget in entries:
+        output = os.path.join(outDir, os.path.basename(path))
+        if os.path.abspath(output) == os.path.abspath(path):
+            raise ValueError("Output would overwrite the instance " + path)
+        tasks.append((path, output, budget if ownBudget is None else ownBudget, instance_size(path)))
+    outputs = [task[1] for task in tasks]
+    if len(set(outputs)) < len(outputs):
+        raise ValueError("Instances with the same file name would share an output file")
+    tasks.sort(key=lambda task: -task[3])
+    return tasks
+
+def solve_instance(task, operator="ox", seed=0):
+    '''
+    Solve one instance within its budget, keeping the best tour in its output file.
+    The solver's progress output is discarded.
+
+    :return: result dict, with an "error" entry instead of a length if the instance could not be solved.
+    '''
+    path, output, budget, _ = task
+    start_time = time.time()
+    result = {"instance": path, "output": output}
+    random.seed(seed)
+    homework.rng = np.random.default_rng(seed)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            cities = load_cities(path)
+            citiesNum = len(cities)
+            dists = Distances(cities)
+            deadline = Deadline(budget)
+            checkpoint = Checkpoint(cities, dists, output)
+            if citiesNum <= 3:
+                checkpoint.offer(list(range(citiesNum)))
+            else:
+                cache = TourCache()
+                paths = homework.evolve(dists, citiesNum, deadline, checkpoint, operator, cache)
+                checkpoint.offer(homework.select_best(paths, dists, deadline, checkpoint, cache))
+        result.update(cities=citiesNum, length=checkpoint.bestLength)
+    except Exception as e:
+        result["error"] = "{}: {}".format(type(e).__name__, e)
+    result["seconds"] = round(time.time() - start_time, 3)
+    return result
+
+def _solve_task(args):
+    ''' Pool entry point '''
+    return solve_instance(*args)
+
+def run_batch(source, outDir="results", budget=BATCH_BUDGET, processes=None, operator="ox", seed=0):
+    '''
+    Solve every instance of a directory or manifest on a process pool, yielding results as instances finish.
+
+    :param budget: seconds per instance unless the manifest gives its own.
+    :param processes: worker processes, CPU count by default.
+    :return: generator of result dicts, in completion order.
+    '''
+    tasks = plan_batch(list_instances(source), outDir, budget)
+    os.makedirs(outDir, exist_ok=True)
+    jobs = [(task, operator, seed + i) for i, task in enumerate(tasks)]
+    processes = min(processes or os.cpu_count() or 1, max(1, len(jobs)))
+    if processes == 1:
+        for job in jobs:
+            yield _solve_task(job)
+        return
+    with mp.Pool(processes) as pool:
+        # One task at a time per worker keeps the largest-first order and lets short ones fill in behind
+        for result in pool.imap_unordered(_solve_task, jobs, chunksize=1):
+            yield result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("source", help="directory of .txt instances, or a manifest of \"path [budget]\" lines")
+    parser.add_argument("--output", "-o", help="directory for the tour files", default="results")
+    parser.add_argument("--budget", "-b", type=float, help="seconds per instance", default=BATCH_BUDGET)
+    parser.add_argument("--processes", "-p", type=int, help="worker processes", default=None)
+    parser.add_argument("--crossover", choices=sorted(homework.CROSSOVERS), help="crossover operator", default="ox")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--results", help="also append the JSON-lines results to this file", default=None)
+    args = parser.parse_args()
+
+    results = open(args.results, "a") if args.results else None
+    start_time = time.time()
+    solved = failed = 0
+    for result in run_batch(args.source, args.output, args.budget, args.processes, args.crossover, args.seed):
+        line = json.dumps(result)
+        print(line, flush=True)
+        if results:
+            results.write(line + "\n")
+            results.flush()
+        if "error" in result:
+            failed += 1
+        else:
+            solved += 1
+    if results:
+        results.close()
+    print("Solved {} instances, {} failed, in {}s".format(solved, failed, round(time.time() - start_time, 3)),
+          file=sys.stderr)
@@ -0,0 +1,179 @@
+import argparse, json, platform, time
+import numpy as np
+
+from distance import Distances
+from construction import greedy_edge_tour, nearest_neighbor_tour, space_filling_tour
+from crossover import CROSSOVERS, crossover_batch
+from local_search import OPERATORS, run_pipeline
+
+INSTANCE_KINDS = ("uniform", "clustered", "planar")
+DEFAULT_SIZES = (100, 1000, 10000, 100000)
+# Coordinates are integers in [0, SCALE)
+SCALE = 10000
+
+def generate_instance(kind, n, seed=0, scale=SCALE):
+    '''
+    Seeded synthetic 3D instance.
+
+    :param kind: "uniform" (cube), "clustered" (gaussian blobs) or "planar" (z = 0).
+    :return: (n, 3) integer array.
+    '''
+    rng = np.random.default_rng(seed)
+    if kind == "uniform":
+        coords = rng.uniform(0, scale, size=(n, 3))
+    elif kind == "clustered":
+        centers = rng.uniform(0, scale, size=(max(1, int(np.sqrt(n) / 2)), 3))
+        coords = centers[rng.integers(0, len(centers), size=n)] + rng.normal(0, scale / 50, size=(n, 3))
+    elif kind == "planar":
+        coords = rng.uniform(0, scale, size=(n, 3))
+        coords[:, 2] = 0
+    else:
+        raise ValueError("Unknown instance kind: " + str(kind))
+    return np.clip(np.round(coords), 0, scale - 1).astype(np.int64)
+
+def neighbor_bound(dists):
+    ''' Lower bound: every city pays at least half of its two shortest incident edges '''
+    if dists.n < 3:
+        return 0.0
+    neigh = dists.neighbors(2)
+    cities = np.arange(dists.n)
+    return float((dists.pairs(cities, neigh[:, 0]) + dists.pairs(cities, neigh[:, 1])).sum() / 2)
+
+def _construction_stage(name):
+    def stage(dists, budget, seed):
+        if name == "nn":
+            return nearest_neighbor_tour(dists.coords, seed % dists.n)
+        if name == "greedy":
+            return greedy_edge_tour(dists)
+        return space_filling_tour(dists.coords)
+    return stage
+
+def _crossover_stage(name):
+    '''
+    One batch of crossovers between distinct parents of a population of space-filling and random tours.
+    The stage length is the mean child length; the mean gain of a child over its better parent is reported too.
+    '''
+    def stage(dists, budget, seed):
+        rng = np.random.default_rng(seed)
+        n = dists.n
+        population = np.array([space_filling_tour(dists.coords)] +
+                              [rng.permutation(n) for _ in range(15)], dtype=np.int32)
+        # A tour crossed with itself comes back unchanged, so both parents are always different
+        first = rng.integers(0, len(population), size=64)
+        second = rng.integers(0, len(population) - 1, size=64)
+        second += second >= first
+        parents = np.stack([first, second], axis=1)
+        cuts = np.sort(np.stack([rng.permutation(n)[:2] for _ in range(64)]), axis=1)
+        children = crossover_batch(population, parents, cuts, name, dists)
+        lengths = dists.tour_lengths(children)
+        better = dists.tour_lengths(population)[parents].min(axis=1)
+        info = {
+            "length": float(lengths.mean()),
+            "best_length": round(float(lengths.min()), 3),
+            "parent_gain": round(float((1 - lengths / better).mean()), 5),
+        }
+        return children[int(np.argmin(lengths))], info
+    return stage
+
+def _local_search_stage(names):
+    ''' Local search operators run from the greedy tour under the stage budget '''
+    def stage(dists, budget, seed):
+        tour, _ = run_pipeline(greedy_edge_tour(dists), dists, stages=names, time_limit=budget)
+        return tour
+    return stage
+
+STAGES = {}
+for _name in ("nn", "greedy", "sfc"):
+    STAGES["construct:" + _name] = _construction_stage(_name)
+for _name in CROSSOVERS:
+    STAGES["crossover:" + _name] = _crossover_stage(_name)
+for _name in OPERATORS:
+    STAGES["local:" + _name] = _local_search_stage((_name,))
+STAGES["local:pipeline"] = _local_search_stage(("2opt", "oropt", "lk"))
+
+def run_benchmark(kinds=INSTANCE_KINDS, sizes=DEFAULT_SIZES, stages=None, budget=10, seed=0, bound=neighbor_bound):
+    '''
+    Run every stage on every instance.
+
+    :param budget: seconds given to each time-bounded stage.
+    :param bound: function (dists) -> lower bound used for the gap.
+    :return: report dict with one result per (instance, stage).
+    '''
+    results = []
+    for kind in kinds:
+        for n in sizes:
+            cities = generate_instance(kind, n, seed)
+            start_time = time.time()
+            dists = Distances(cities)
+            setup = time.time() - start_time
+            lowerBound = bound(dists)
+            for name in stages or STAGES:
+                start_time = time.time()
+                tour = STAGES[name](dists, budget, seed)
+                elapsed = time.time() - start_time
+                # Stages may report their own length and extra metrics along with the tour
+                tour, info = tour if isinstance(tour, tuple) else (tour, {})
+                length = info.pop("length", None)
+                if length is None:
+                    length = dists.tour_length(tour)
+                results.append({
+                    "kind": kind,
+                    "n": n,
+                    "seed": seed,
+                    "stage": name,
+                    "seconds": round(elapsed, 4),
+                    "length": round(length, 3),
+                    "bound": round(lowerBound, 3),
+                    "gap": round(length / lowerBound - 1, 5) if lowerBound > 0 else None,
+                    "setup_seconds": round(setup, 4),
+                    "distance_mode": dists.mode,
+                    **info,
+                })
+                print("{:>9} {:>7} {:>18} {:9.3f}s gap {}".format(kind, n, name, elapsed, results[-1]["gap"]))
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "budget": budget,
+        "results": results,
+    }
+
+def compare_reports(report, baseline, tolerance=0.05, minSeconds=0.05):
+    '''
+    Results that got slower or worse than the baseline by more than tolerance (relative).
+    Time differences below minSeconds are treated as noise.
+
+    :return: list of (kind, n, stage, metric, baseline value, new value).
+    '''
+    old = {(r["kind"], r["n"], r["seed"], r["stage"]): r for r in baseline["results"]}
+    regressions = []
+    for r in report["results"]:
+        before = old.get((r["kind"], r["n"], r["seed"], r["stage"]))
+        if before is None:
+            continue
+        for metric in ("seconds", "length"):
+            if metric == "seconds" and r[metric] - before[metric] < minSeconds:
+                continue
+            if before[metric] > 0 and r[metric] > before[metric] * (1 + tolerance):
+                regressions.append((r["kind"], r["n"], r["stage"], metric, before[metric], r[metric]))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--kinds", nargs="+", choices=INSTANCE_KINDS, default=list(INSTANCE_KINDS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES))
+    parser.add_argument("--stages", nargs="+", choices=sorted(STAGES), default=None)
+    parser.add_argument("--budget", "-b", type=float, help="seconds per time-bounded stage", default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", "-o", help="JSON report file", default="benchmark.json")
+    parser.add_argument("--baseline", help="previous JSON report to check for regressions", default=None)
+    args = parser.parse_args()
+
+    report = run_benchmark(args.kinds, args.sizes, args.stages, args.budget, args.seed)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_reports(report, json.load(f))
+        for kind, n, stage, metric, before, after in regressions:
+            print("REGRESSION {} {} {} {}: {} -> {}".format(kind, n, stage, metric, before, after))
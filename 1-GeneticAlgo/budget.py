@@ -0,0 +1,89 @@
+import math, os, tempfile, time
+
+from tsp_io import write_tour
+
+# Share of the wall-clock budget given to each phase, in run order
+PHASES = (("construction", 0.15), ("evolution", 0.55), ("polish", 0.30))
+
+class Deadline():
+    ''' One wall-clock budget split across the solver phases, unused time rolls over to later phases '''
+
+    def __init__(self, total=None, phases=PHASES):
+        '''
+        :param total: budget in seconds, None for no limit.
+        :param phases: (name, share) pairs in run order.
+        '''
+        self.start = time.time()
+        self.total = total
+        self.end = math.inf if total is None else self.start + total
+        self.phaseEnds = {}
+        elapsed = 0.0
+        shares = sum(share for _, share in phases)
+        for name, share in phases:
+            elapsed += share / shares
+            self.phaseEnds[name] = math.inf if total is None else self.start + total * elapsed
+
+    def remaining(self, phase=None):
+        ''' Seconds left overall, or before the end of a phase '''
+        end = self.end if phase is None else self.phaseEnds[phase]
+        return max(0.0, end - time.time())
+
+    def expired(self, phase=None):
+        return self.remaining(phase) <= 0
+
+    def limit(self, seconds, phase=None):
+        ''' A per-call time limit capped by what is left of the budget '''
+        return min(seconds, self.remaining(phase))
+
+def _file_mode():
+    ''' Permissions open() would give a new file under the current umask '''
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+class Checkpoint():
+    ''' Keeps the best tour seen so far on disk, replaced atomically whenever it improves '''
+
+    def __init__(self, cities, dists, filename="output.txt"):
+        self.cities = cities
+        self.dists = dists
+        self.filename = filename
+        self.bestLength = math.inf
+        self.bestPath = None
+        self.writes = 0
+
+    def offer(self, path):
+        '''
+        Record a tour, writing it out if it beats the best so far.
+
+        :param path: open tour, the start city is repeated at the end of the written file.
+        :return: True if the checkpoint was updated.
+        '''
+        path = [int(city) for city in path]
+        if path and path[0] == path[-1] and len(path) > 1:
+            path = path[:-1]
+        length = round(self.dists.tour_length(path), 3)
+        if length >= self.bestLength:
+            return False
+        self.bestLength = length
+        self.bestPath = path
+        self._write(path + path[:1], length)
+        return True
+
+    def _write(self, path, length):
+        ''' Write to a temporary file in the same directory, then rename over the target '''
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        fd, tmpName = tempfile.mkstemp(prefix=".checkpoint-", suffix=".txt", dir=directory)
+        os.close(fd)
+        try:
+            # mkstemp files are owner-only, the output keeps the usual permissions
+            os.chmod(tmpName, _file_mode())
+            write_tour(self.cities, path, length, tmpName)
+            with open(tmpName, "rb+") as f:
+                os.fsync(f.fileno())
+            os.replace(tmpName, self.filename)
+        except BaseException:
+            if os.path.exists(tmpName):
+                os.remove(tmpName)
+            raise
+        self.writes += 1
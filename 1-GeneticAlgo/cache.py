@@ -0,0 +1,83 @@
+import hashlib
+from collections import OrderedDict
+import numpy as np
+
+# Tour lengths kept by default
+CACHE_SIZE = 1 << 16
+
+def canonical_tours(population):
+    '''
+    Rotation- and direction-invariant form of every tour: start at the smallest city,
+    then go towards its smaller neighbor.
+
+    :param population: (pop_size, n) integer array.
+    :return: array of the same shape.
+    '''
+    population = np.atleast_2d(np.asarray(population))
+    n = population.shape[1]
+    start = np.argmin(population, axis=1)
+    canon = np.take_along_axis(population, (start[:, None] + np.arange(n)) % n, axis=1)
+    if n > 2:
+        flip = canon[:, 1] > canon[:, -1]
+        canon[flip, 1:] = canon[flip, :0:-1]
+    return canon
+
+def tour_keys(population):
+    ''' 16-byte digest of each canonical tour '''
+    canon = np.ascontiguousarray(canonical_tours(population), dtype=np.int32)
+    return [hashlib.blake2b(row.tobytes(), digest_size=16).digest() for row in canon]
+
+def unique_tours(population):
+    ''' Indexes of the first occurrence of every distinct tour, in population order '''
+    seen = set()
+    keep = []
+    for i, key in enumerate(tour_keys(population)):
+        if key not in seen:
+            seen.add(key)
+            keep.append(i)
+    return np.array(keep, dtype=np.int64)
+
+class TourCache():
+    ''' LRU memo of tour lengths keyed by canonical tour hash '''
+
+    def __init__(self, maxSize=CACHE_SIZE):
+        self.maxSize = maxSize
+        self.lengths = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def tour_lengths(self, population, dists):
+        '''
+        Lengths of every tour, computing only the ones not seen before in one batch.
+
+        :return: float array of tour lengths.
+        '''
+        population = np.atleast_2d(np.asarray(population))
+        keys = tour_keys(population)
+        result = np.empty(len(keys))
+        missing = []
+        for i, key in enumerate(keys):
+            length = self.lengths.get(key)
+            if length is None:
+                missing.append(i)
+            else:
+                self.lengths.move_to_end(key)
+                result[i] = length
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            result[missing] = dists.tour_lengths(population[missing])
+            for i in missing:
+                self.lengths[keys[i]] = float(result[i])
+            while len(self.lengths) > self.maxSize:
+                self.lengths.popitem(last=False)
+        return result
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "size": len(self.lengths),
+        }
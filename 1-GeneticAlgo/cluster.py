@@ -0,0 +1,182 @@
+import math, os
+import multiprocessing as mp
+import numpy as np
+
+from distance import Distances
+from construction import greedy_edge_tour
+from local_search import run_pipeline
+
+# Largest cluster solved as one subproblem
+CLUSTER_SIZE = 1000
+# Local search used inside clusters and on the seams
+CLUSTER_PIPELINE = ("2opt", "oropt")
+SEAM_PIPELINE = ("2opt", "oropt", "lk")
+# Cities on each side of a junction re-opened by the seam search
+SEAM_WIDTH = 10
+KMEANS_ITERATIONS = 8
+
+def octree_partition(coords, maxSize=CLUSTER_SIZE):
+    '''
+    Split the bounding box in eight until every cell holds at most maxSize cities.
+
+    :return: list of index arrays, one per non-empty cell.
+    '''
+    coords = np.asarray(coords, dtype=np.float64)
+    cells = []
+    stack = [np.arange(len(coords))]
+    while stack:
+        idx = stack.pop()
+        if len(idx) <= maxSize:
+            if len(idx):
+                cells.append(idx)
+            continue
+        sub = coords[idx]
+        low = sub.min(axis=0)
+        high = sub.max(axis=0)
+        if not (high > low).any():
+            # Identical points cannot be split spatially
+            cells.extend(np.array_split(idx, math.ceil(len(idx) / maxSize)))
+            continue
+        mid = (low + high) / 2
+        octant = ((sub > mid) * np.array([1, 2, 4])).sum(axis=1)
+        for o in range(8):
+            part = idx[octant == o]
+            if len(part):
+                stack.append(part)
+    return cells
+
+def kmeans_partition(coords, maxSize=CLUSTER_SIZE, iterations=KMEANS_ITERATIONS, seed=0):
+    '''
+    Lloyd's k-means with about n / maxSize centers; clusters still larger than maxSize are split by octree.
+
+    :return: list of index arrays.
+    '''
+    coords = np.asarray(coords, dtype=np.float64)
+    n = len(coords)
+    k = max(1, math.ceil(n / maxSize))
+    rng = np.random.default_rng(seed)
+    centers = coords[rng.choice(n, size=k, replace=False)]
+    step = max(1, (1 << 20) // k)
+    labels = np.empty(n, dtype=np.int64)
+    for _ in range(iterations):
+        for start in range(0, n, step):
+            block = coords[start:start + step]
+            # |a-b|^2 = |a|^2 - 2ab + |b|^2, the |a|^2 term does not change the argmin
+            scores = (centers ** 2).sum(axis=1)[None, :] - 2 * block @ centers.T
+            labels[start:start + step] = np.argmin(scores, axis=1)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, coords)
+        filled = counts > 0
+        centers[filled] = sums[filled] / counts[filled, None]
+    order = np.argsort(labels, kind="stable")
+    bounds = np.searchsorted(labels[order], np.arange(k + 1))
+    cells = []
+    for c in range(k):
+        idx = order[bounds[c]:bounds[c + 1]]
+        if len(idx) > maxSize:
+            cells.extend(idx[part] for part in octree_partition(coords[idx], maxSize))
+        elif len(idx):
+            cells.append(idx)
+    return cells
+
+PARTITIONS = {
+    "octree": octree_partition,
+    "kmeans": kmeans_partition,
+}
+
+def _solve_cluster(task):
+    ''' Worker: greedy tour of one cluster polished by local search, returned as global city indexes '''
+    idx, coords, timeLimit = task
+    if len(idx) <= 3:
+        return idx
+    dists = Distances(coords)
+    tour, _ = run_pipeline(greedy_edge_tour(dists), dists, stages=CLUSTER_PIPELINE, time_limit=timeLimit)
+    return idx[np.asarray(tour)]
+
+def _cluster_order(centroids):
+    ''' Visiting order of the clusters: a tour over their centroids '''
+    if len(centroids) <= 3:
+        return list(range(len(centroids)))
+    dists = Distances(centroids)
+    tour, _ = run_pipeline(greedy_edge_tour(dists), dists, stages=("2opt", "oropt"), time_limit=10)
+    return tour
+
+def stitch(subtours, coords):
+    '''
+    Join cluster cycles into one tour.
+
+    Clusters are visited in centroid-tour order. Each cycle is entered at its city closest to where the previous one
+    was left, and is walked in the direction whose last city lies closer to the next cluster.
+
+    :return: tour as an integer array, and the junction cities.
+    '''
+    coords = np.asarray(coords, dtype=np.float64)
+    centroids = np.array([coords[t].mean(axis=0) for t in subtours])
+    order = _cluster_order(centroids)
+    pieces = []
+    junctions = []
+    exitPoint = centroids[order[-1]]
+    for pos, c in enumerate(order):
+        cycle = np.asarray(subtours[c])
+        nextCentroid = centroids[order[(pos + 1) % len(order)]]
+        entry = int(np.argmin(((coords[cycle] - exitPoint) ** 2).sum(axis=1)))
+        path = np.roll(cycle, -entry)
+        # The walk ends at one of entry's cycle neighbors, pick the one nearer the next cluster
+        if len(path) > 2 and (((coords[path[1]] - nextCentroid) ** 2).sum() <
+                              ((coords[path[-1]] - nextCentroid) ** 2).sum()):
+            path = np.concatenate([path[:1], path[:0:-1]])
+        pieces.append(path)
+        junctions.extend((int(path[0]), int(path[-1])))
+        exitPoint = coords[path[-1]]
+    return np.concatenate(pieces), junctions
+
+def seam_cities(tour, junctions, width=SEAM_WIDTH):
+    ''' Cities within width tour positions of a junction '''
+    tour = np.asarray(tour)
+    n = len(tour)
+    pos = np.empty(n, dtype=np.int64)
+    pos[tour] = np.arange(n)
+    offsets = np.arange(-width, width + 1)
+    near = (pos[np.asarray(junctions)][:, None] + offsets[None, :]) % n
+    return np.unique(tour[near.ravel()])
+
+def solve_clustered(cities, dists=None, maxSize=CLUSTER_SIZE, method="octree", processes=None,
+                    clusterTime=1.0, seamTime=30.0, deadline=None):
+    '''
+    Divide-and-conquer solver for very large instances.
+
+    :param cities: (n, 3) coordinates.
+    :param dists: Distances over all cities, built if not given.
+    :param maxSize: largest cluster.
+    :param method: partition method from PARTITIONS.
+    :param processes: worker processes for the clusters, CPU count by default.
+    :param clusterTime: local search seconds per cluster.
+    :param seamTime: local search seconds on the seams.
+    :param deadline: optional Deadline, clusters share the evolution phase and seams get the polish phase.
+    :return: tour as a list.
+    '''
+    coords = np.asarray(cities, dtype=np.float64)
+    if dists is None:
+        dists = Distances(coords)
+    clusters = PARTITIONS[method](coords, maxSize)
+    processes = processes or os.cpu_count() or 1
+    if deadline:
+        waves = math.ceil(len(clusters) / processes)
+        clusterTime = min(clusterTime, deadline.remaining("evolution") / max(1, waves))
+    tasks = [(idx, coords[idx], clusterTime) for idx in clusters]
+    # Biggest clusters first so the last wave is not one large straggler
+    tasks.sort(key=lambda task: -len(task[0]))
+    if processes > 1 and len(tasks) > 1:
+        with mp.Pool(processes) as pool:
+            subtours = pool.map(_solve_cluster, tasks, chunksize=max(1, len(tasks) // (processes * 4)))
+    else:
+        subtours = [_solve_cluster(task) for task in tasks]
+
+    tour, junctions = stitch(subtours, coords)
+    if len(clusters) > 1:
+        if deadline:
+            seamTime = min(seamTime, deadline.remaining("polish"))
+        tour, _ = run_pipeline(tour, dists, stages=SEAM_PIPELINE, time_limit=seamTime,
+                               active=seam_cities(tour, junctions).tolist())
+    return [int(city) for city in tour]
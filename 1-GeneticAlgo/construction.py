@@ -0,0 +1,405 @@
+import heapq, math
+from collections import OrderedDict
+import numpy as np
+
+# Average number of points per grid cell
+POINTS_PER_CELL = 2
+# Bits per axis of the Hilbert curve
+HILBERT_BITS = 10
+# Candidate neighbors per city considered by the greedy-edge construction
+GREEDY_NEIGHBORS = 10
+# Below this many cities a vectorized scan beats the grid for nearest-neighbor tours
+BRUTE_FORCE_CITIES = 1000
+# Largest members x candidates distance block computed at once by knn_all
+KNN_BLOCK = 1 << 16
+# Times knn_all may shrink its cells towards about k cities per occupied cell
+KNN_REFINE = 4
+
+class PointGrid():
+    ''' Uniform 3D grid over a set of points, supports nearest-neighbor queries and deletion '''
+
+    def __init__(self, coords, points=None, perCell=POINTS_PER_CELL):
+        '''
+        Bucket points into cells holding about perCell points each.
+
+        :param coords: (n, 3) coordinates of every city.
+        :param points: city indexes to insert, all cities by default.
+        '''
+        coords = np.asarray(coords, dtype=np.float64)
+        self.array = coords
+        self.coords = coords.tolist()
+        points = np.arange(len(coords)) if points is None else np.asarray(points, dtype=np.int64)
+        self.count = len(points)
+        if self.count == 0:
+            points = np.arange(0)
+        sub = coords[points] if self.count else np.zeros((1, 3))
+        self.low = sub.min(axis=0)
+        self.lowList = self.low.tolist()
+        spans = sub.max(axis=0) - self.low
+        # Cubic cells sized from the volume (or area/length) actually spanned, so planar inputs work too
+        flat = spans > 0
+        cells = max(1.0, self.count / perCell)
+        if flat.any():
+            side = (np.prod(spans[flat]) / cells) ** (1.0 / flat.sum())
+        else:
+            side = 1.0
+        self.side = float(max(side, 1e-9))
+        self.dims = [max(1, int(math.ceil(s / self.side)) + (1 if s > 0 else 0)) for s in spans]
+        self.buckets = {}
+        self.slot = {}
+        cellIds = self._cells(sub)
+        for city, cell in zip(points.tolist(), cellIds.tolist()):
+            bucket = self.buckets.setdefault(cell, [])
+            self.slot[city] = len(bucket)
+            bucket.append(city)
+
+    def _cells(self, points):
+        ''' Flat cell ids of an (m, 3) coordinate array '''
+        idx = np.floor((points - self.low) / self.side).astype(np.int64)
+        idx = np.clip(idx, 0, np.array(self.dims) - 1)
+        return (idx[:, 0] * self.dims[1] + idx[:, 1]) * self.dims[2] + idx[:, 2]
+
+    def _cell_of(self, point):
+        ''' (x, y, z) cell holding a point, same rounding as _cells '''
+        return tuple(min(d - 1, max(0, math.floor((point[i] - self.lowList[i]) / self.side)))
+                     for i, d in enumerate(self.dims))
+
+    def remove(self, city):
+        ''' Delete a city from the grid in O(1) '''
+        x, y, z = self._cell_of(self.coords[city])
+        cell = (x * self.dims[1] + y) * self.dims[2] + z
+        bucket = self.buckets[cell]
+        i = self.slot.pop(city)
+        last = bucket.pop()
+        if last != city:
+            bucket[i] = last
+            self.slot[last] = i
+        self.count -= 1
+
+    def _rings(self, center):
+        ''' Yield (radius, cells at Chebyshev distance radius) around a cell until the grid is covered '''
+        gx, gy, gz = self.dims
+        cx, cy, cz = center
+        maxRadius = max(cx, gx - 1 - cx, cy, gy - 1 - cy, cz, gz - 1 - cz)
+        for r in range(maxRadius + 1):
+            cells = []
+            for x in range(max(0, cx - r), min(gx, cx + r + 1)):
+                edgeX = abs(x - cx) == r
+                for y in range(max(0, cy - r), min(gy, cy + r + 1)):
+                    edgeY = edgeX or abs(y - cy) == r
+                    if edgeY:
+                        zs = range(max(0, cz - r), min(gz, cz + r + 1))
+                    else:
+                        zs = [z for z in (cz - r, cz + r) if 0 <= z < gz]
+                    base = (x * gy + y) * gz
+                    for z in zs:
+                        cells.append(base + z)
+            yield r, cells
+
+    def nearest(self, point, exclude=None):
+        '''
+        Closest city still in the grid.
+
+        :param point: query coordinates.
+        :param exclude: city to ignore, usually the query city itself.
+        :return: city index, or None when the grid is empty.
+        '''
+        coords = self.coords
+        buckets = self.buckets
+        best = None
+        bestDist = math.inf
+        for r, cells in self._rings(self._cell_of(point)):
+            for cell in cells:
+                bucket = buckets.get(cell)
+                if not bucket:
+                    continue
+                for city in bucket:
+                    d = math.dist(point, coords[city])
+                    if d < bestDist and city != exclude:
+                        best, bestDist = city, d
+            if bestDist <= r * self.side:
+                break
+        return best
+
+    def knn(self, point, k, exclude=None):
+        ''' k closest cities still in the grid, closest first '''
+        coords = self.coords
+        buckets = self.buckets
+        heap = []
+        for r, cells in self._rings(self._cell_of(point)):
+            for cell in cells:
+                bucket = buckets.get(cell)
+                if not bucket:
+                    continue
+                for city in bucket:
+                    if city == exclude:
+                        continue
+                    d = math.dist(point, coords[city])
+                    if len(heap) < k:
+                        heapq.heappush(heap, (-d, city))
+                    elif d < -heap[0][0]:
+                        heapq.heapreplace(heap, (-d, city))
+            # Cells beyond this ring are at least r cell sides away
+            if len(heap) == k and -heap[0][0] <= r * self.side:
+                break
+        return [city for _, city in sorted(heap, reverse=True)]
+
+    def knn_all(self, k, run=4):
+        '''
+        k closest cities of every city in the grid, computed with NumPy.
+
+        Cities are bucketed into cells holding about k of them (sized from the occupied cells, so clustered
+        inputs get small cells), and runs of cells along z are solved against the surrounding cells. A result
+        is exact when the k-th neighbor is within one cell side; the other cities are retried with cells twice
+        as large, and whatever is left at the end falls back to knn.
+
+        :param run: cells per run, members of a run share one candidate set.
+        :return: (len(coords), k) integer array, rows of cities not in the grid are -1.
+        '''
+        result = np.full((len(self.array), k), -1, dtype=np.int64)
+        cities = np.array([city for bucket in self.buckets.values() for city in bucket], dtype=np.int64)
+        if k == 0 or len(cities) <= k:
+            for city in cities.tolist():
+                result[city, :len(cities) - 1] = self.knn(self.coords[city], k, exclude=city)
+            return result
+        points = self.array[cities]
+        low = points.min(axis=0)
+        spans = points.max(axis=0) - low
+        dims = max(1, int((spans > 0).sum()))
+        side = self.side
+        for _ in range(KNN_REFINE):
+            idx = np.floor((points - low) / side).astype(np.int64)
+            shape = idx.max(axis=0) + 1
+            perCell = len(points) / len(np.unique((idx[:, 0] * shape[1] + idx[:, 1]) * shape[2] + idx[:, 2]))
+            if perCell <= 2 * k:
+                break
+            side /= (perCell / k) ** (1.0 / dims)
+        remaining = np.arange(len(points))
+        while len(remaining) and side <= 2 * spans.max():
+            remaining = self._knn_level(cities, points, remaining, low, side, k, run, result)
+            side *= 2
+        for i in remaining.tolist():
+            city = int(cities[i])
+            result[city] = self.knn(self.coords[city], k, exclude=city)
+        return result
+
+    @staticmethod
+    def _knn_level(cities, points, members, low, side, k, run, result):
+        '''
+        One knn_all pass with cells of the given side over the members (indexes into points).
+
+        :return: members whose neighbors could not be proven exact at this cell size.
+        '''
+        idx = np.floor((points - low) / side).astype(np.int64)
+        gx, gy, gz = (idx.max(axis=0) + 1).tolist()
+        keys = (idx[:, 0] * gy + idx[:, 1]) * gz + idx[:, 2]
+        order = np.argsort(keys, kind="stable")
+        sortedKeys = keys[order]
+        # Members grouped by run: cells z0..z0+run-1 of one (x, y) column
+        memberIdx = idx[members]
+        runKeys = (memberIdx[:, 0] * gy + memberIdx[:, 1]) * gz + memberIdx[:, 2] // run * run
+        memberOrder = np.argsort(runKeys, kind="stable")
+        members = members[memberOrder]
+        runKeys = runKeys[memberOrder]
+        runStarts = np.flatnonzero(np.concatenate([[True], runKeys[1:] != runKeys[:-1]]))
+        runEnds = np.append(runStarts[1:], len(members))
+        x = runKeys[runStarts] // (gy * gz)
+        y = runKeys[runStarts] // gz % gy
+        z = runKeys[runStarts] % gz
+        # Candidates: cells z0-1..z0+run of the 3 x 3 surrounding columns, each a contiguous slice of order
+        bounds = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                nx = x + dx
+                ny = y + dy
+                valid = (nx >= 0) & (nx < gx) & (ny >= 0) & (ny < gy)
+                base = (nx * gy + ny) * gz
+                lo = np.searchsorted(sortedKeys, base + np.maximum(z - 1, 0))
+                hi = np.searchsorted(sortedKeys, base + np.minimum(z + run + 1, gz))
+                bounds.append((np.where(valid, lo, 0), np.where(valid, hi, 0)))
+        lows = np.stack([lo for lo, _ in bounds], axis=1).tolist()
+        highs = np.stack([hi for _, hi in bounds], axis=1).tolist()
+        limit = side * side
+        remaining = []
+        for r, (start, end) in enumerate(zip(runStarts.tolist(), runEnds.tolist())):
+            block = members[start:end]
+            candidates = np.concatenate([order[lo:hi] for lo, hi in zip(lows[r], highs[r]) if hi > lo])
+            if len(candidates) <= k:
+                remaining.append(block)
+                continue
+            nearest = _knn_block(points, block, candidates, k)
+            # Anything outside the candidate cells is at least one side away
+            diff = points[block] - points[nearest[:, -1]]
+            exact = np.einsum("ij,ij->i", diff, diff) <= limit
+            result[cities[block[exact]]] = cities[nearest[exact]]
+            remaining.append(block[~exact])
+        return np.concatenate(remaining) if remaining else members[:0]
+
+def _knn_block(points, members, candidates, k):
+    ''' k closest candidates of every member by brute force, in slices of at most KNN_BLOCK distances '''
+    nearest = np.empty((len(members), k), dtype=np.int64)
+    step = max(1, KNN_BLOCK // len(candidates))
+    candPoints = points[candidates]
+    for start in range(0, len(members), step):
+        block = members[start:start + step]
+        diff = points[block][:, None, :] - candPoints[None, :, :]
+        dist = np.einsum("ijk,ijk->ij", diff, diff)
+        dist[block[:, None] == candidates[None, :]] = np.inf
+        part = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(dist, part, axis=1), axis=1, kind="stable")
+        nearest[start:start + step] = candidates[np.take_along_axis(part, order, axis=1)]
+    return nearest
+
+def nearest_neighbor_tour(coords, start=0):
+    ''' Nearest-neighbor tour from start, each step is a grid query followed by a deletion '''
+    coords = np.asarray(coords, dtype=np.float64)
+    if len(coords) <= BRUTE_FORCE_CITIES:
+        return _nearest_neighbor_scan(coords, start)
+    grid = PointGrid(coords)
+    points = grid.coords
+    tour = [start]
+    grid.remove(start)
+    while grid.count:
+        city = grid.nearest(points[tour[-1]])
+        grid.remove(city)
+        tour.append(city)
+    return tour
+
+def _nearest_neighbor_scan(coords, start):
+    ''' Nearest-neighbor tour by scanning all remaining cities with NumPy, fastest for small inputs '''
+    n = len(coords)
+    tour = [start]
+    visited = np.zeros(n, dtype=bool)
+    visited[start] = True
+    for _ in range(n - 1):
+        diff = coords - coords[tour[-1]]
+        row = np.einsum("ij,ij->i", diff, diff)
+        row[visited] = np.inf
+        city = int(np.argmin(row))
+        tour.append(city)
+        visited[city] = True
+    return tour
+
+def greedy_edge_tour(dists, k=GREEDY_NEIGHBORS):
+    '''
+    Greedy-edge construction: add candidate edges shortest first while they keep degrees <= 2 and create no cycle,
+    then join the resulting fragments nearest endpoint first.
+    '''
+    n = dists.n
+    if n < 3:
+        return list(range(n))
+    neigh = dists.neighbors(k)
+    a = np.repeat(np.arange(n), neigh.shape[1])
+    b = neigh.ravel()
+    keep = a < b
+    a, b = a[keep], b[keep]
+    order = np.argsort(dists.pairs(a, b), kind="stable")
+
+    degree = [0] * n
+    parent = list(range(n))
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+    adj = [[] for _ in range(n)]
+    for i, j in zip(a[order].tolist(), b[order].tolist()):
+        if degree[i] >= 2 or degree[j] >= 2:
+            continue
+        ri, rj = find(i), find(j)
+        if ri == rj:
+            continue
+        parent[ri] = rj
+        degree[i] += 1
+        degree[j] += 1
+        adj[i].append(j)
+        adj[j].append(i)
+
+    # Fragment endpoints (single cities count once) index the joining grid
+    ends = [c for c in range(n) if degree[c] < 2]
+    grid = PointGrid(dists.coords, ends)
+    points = grid.coords
+    tour = []
+    city = ends[0]
+    while True:
+        first = city
+        grid.remove(city)
+        # Walk the fragment to its other end
+        prev = None
+        while True:
+            tour.append(city)
+            nxt = [c for c in adj[city] if c != prev]
+            if not nxt:
+                break
+            prev, city = city, nxt[0]
+        if city != first:
+            grid.remove(city)
+        if not grid.count:
+            break
+        city = grid.nearest(points[city])
+    return tour
+
+def hilbert_keys(coords, bits=HILBERT_BITS):
+    ''' Position of every point along a 3D Hilbert curve (Skilling's transpose algorithm, vectorized) '''
+    coords = np.asarray(coords, dtype=np.float64)
+    low = coords.min(axis=0)
+    span = max(float((coords.max(axis=0) - low).max()), 1e-9)
+    top = (1 << bits) - 1
+    X = np.minimum((coords - low) / span * top, top).astype(np.uint64)
+    M = np.uint64(1 << (bits - 1))
+
+    # Inverse undo
+    Q = M
+    while Q > 1:
+        P = Q - np.uint64(1)
+        for i in range(3):
+            flip = (X[:, i] & Q) != 0
+            X[flip, 0] ^= P
+            t = (X[~flip, 0] ^ X[~flip, i]) & P
+            X[~flip, 0] ^= t
+            X[~flip, i] ^= t
+        Q >>= np.uint64(1)
+    # Gray encode
+    for i in range(1, 3):
+        X[:, i] ^= X[:, i - 1]
+    t = np.zeros(len(X), dtype=np.uint64)
+    Q = M
+    while Q > 1:
+        t ^= np.where((X[:, 2] & Q) != 0, Q - np.uint64(1), np.uint64(0))
+        Q >>= np.uint64(1)
+    X ^= t[:, None]
+
+    # Interleave the transposed bits into one key
+    keys = np.zeros(len(X), dtype=np.uint64)
+    for b in range(bits - 1, -1, -1):
+        for i in range(3):
+            keys = (keys << np.uint64(1)) | ((X[:, i] >> np.uint64(b)) & np.uint64(1))
+    return keys
+
+def space_filling_tour(coords, bits=HILBERT_BITS):
+    ''' Cities in Hilbert curve order '''
+    return np.argsort(hilbert_keys(coords, bits), kind="stable").tolist()
+
+class NNTourCache():
+    ''' Nearest-neighbor tours keyed by start city, least recently used evicted first '''
+
+    def __init__(self, coords, maxSize=None):
+        self.coords = coords
+        self.maxSize = maxSize
+        self.tours = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, start):
+        ''' Copy of the nearest-neighbor tour from start '''
+        tour = self.tours.get(start)
+        if tour is None:
+            self.misses += 1
+            tour = nearest_neighbor_tour(self.coords, start)
+            self.tours[start] = tour
+            if self.maxSize is not None and len(self.tours) > self.maxSize:
+                self.tours.popitem(last=False)
+        else:
+            self.hits += 1
+            self.tours.move_to_end(start)
+        return list(tour)
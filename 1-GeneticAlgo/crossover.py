@@ -0,0 +1,286 @@
+import random, time
+import numpy as np
+
+# Nearest neighbors tried when EAX reconnects its subtours
+EAX_NEIGHBORS = 10
+
+def order_crossover(parent1, parent2, startInd, endInd):
+    '''
+    Order crossover (OX): keep parent1[startInd..endInd], fill the rest from endInd+1 on with parent2's remaining cities in parent2 order.
+
+    :return: child as an integer array.
+    '''
+    parent1 = np.asarray(parent1)
+    parent2 = np.asarray(parent2)
+    n = len(parent1)
+    child = np.empty(n, dtype=parent1.dtype)
+    child[startInd:endInd+1] = parent1[startInd:endInd+1]
+    visited = np.zeros(n, dtype=bool)
+    visited[parent1[startInd:endInd+1]] = True
+    rest = parent2[~visited[parent2]]
+    child[(endInd + 1 + np.arange(len(rest))) % n] = rest
+    return child
+
+def pmx_crossover(parent1, parent2, startInd, endInd):
+    ''' Partially mapped crossover (PMX): keep parent1's slice, place displaced parent2 cities through the slice mapping '''
+    dtype = np.asarray(parent1).dtype
+    parent1 = np.asarray(parent1).tolist()
+    parent2 = np.asarray(parent2).tolist()
+    n = len(parent1)
+    child = list(parent2)
+    inSlice = [False] * n
+    pos2 = [0] * n
+    for i, city in enumerate(parent2):
+        pos2[city] = i
+    for i in range(startInd, endInd + 1):
+        inSlice[parent1[i]] = True
+        child[i] = parent1[i]
+    for i in range(startInd, endInd + 1):
+        city = parent2[i]
+        if inSlice[city]:
+            continue
+        # Follow the mapping until it leaves the slice
+        j = i
+        while startInd <= j <= endInd:
+            j = pos2[parent1[j]]
+        child[j] = city
+    return np.array(child, dtype=dtype)
+
+def cycle_crossover(parent1, parent2, startInd, endInd):
+    ''' Cycle crossover (CX): take the cycle through startInd from parent1 and every other position from parent2 '''
+    parent1 = np.asarray(parent1)
+    parent2 = np.asarray(parent2)
+    p1 = parent1.tolist()
+    p2 = parent2.tolist()
+    pos1 = [0] * len(p1)
+    for i, city in enumerate(p1):
+        pos1[city] = i
+    child = parent2.copy()
+    j = startInd
+    while True:
+        child[j] = p1[j]
+        j = pos1[p2[j]]
+        if j == startInd:
+            break
+    return child
+
+def _ab_cycles(adjA, adjB, rnd):
+    '''
+    Split the edges of two tours that are not shared into AB-cycles, cycles alternating between A and B edges.
+
+    :param adjA: for every city the list of its A-neighbors, consumed by the search (same for adjB).
+    :return: list of cycles, each a list of cities c0, c1, ... where (c0, c1) is an A edge, (c1, c2) a B edge, etc.
+    '''
+    cycles = []
+    for start in range(len(adjA)):
+        while adjA[start]:
+            path = [start]
+            # Positions of every city on the path, used to close cycles
+            seen = {start: [0]}
+            while True:
+                cur = path[-1]
+                # Edge number len(path) - 1 is an A edge when even
+                adj = adjA if len(path) % 2 == 1 else adjB
+                nxt = adj[cur].pop(rnd.randrange(len(adj[cur])))
+                adj[nxt].remove(cur)
+                path.append(nxt)
+                closed = None
+                # The cycle can close where the edge leaving the earlier visit has the other type
+                for i in seen.get(nxt, ()):
+                    if i % 2 != (len(path) - 2) % 2:
+                        closed = i
+                        break
+                if closed is None:
+                    seen.setdefault(nxt, []).append(len(path) - 1)
+                    continue
+                cycle = path[closed:]
+                # Rotate so the cycle starts with an A edge
+                cycles.append(cycle[:-1] if closed % 2 == 0 else cycle[1:-1] + cycle[:1])
+                for city in path[closed + 1:]:
+                    positions = seen[city]
+                    positions[:] = [i for i in positions if i <= closed]
+                del path[closed + 1:]
+                if len(path) == 1:
+                    break
+    return cycles
+
+def _merge_subtours(adj, dists, neigh):
+    '''
+    Join the subtours of a degree-2 edge set into one tour, always merging the smallest subtour into a neighbor
+    with the cheapest 2-opt style exchange over the candidate neighbors.
+
+    :param adj: list of the two neighbors of every city, updated in place.
+    '''
+    n = len(adj)
+    comp = [-1] * n
+    members = []
+    for start in range(n):
+        if comp[start] >= 0:
+            continue
+        cities = [start]
+        comp[start] = len(members)
+        prev, cur = start, adj[start][0]
+        while cur != start:
+            comp[cur] = len(members)
+            cities.append(cur)
+            prev, cur = cur, adj[cur][1] if adj[cur][0] == prev else adj[cur][0]
+        members.append(cities)
+    alive = set(range(len(members)))
+    d = dists.dist
+    while len(alive) > 1:
+        small = min(alive, key=lambda c: len(members[c]))
+        pairs = [(u, v) for u in members[small] for v in neigh[u] if comp[v] != small]
+        if not pairs:
+            # No neighbor list leaves the subtour: join at its first city's closest outside city
+            u = members[small][0]
+            row = dists.row(u)
+            row[members[small]] = np.inf
+            pairs = [(u, int(np.argmin(row)))]
+        best = None
+        for u, v in pairs:
+            for u2 in set(adj[u]):
+                for v2 in set(adj[v]):
+                    delta = d(u, v) + d(u2, v2) - d(u, u2) - d(v, v2)
+                    if best is None or delta < best[0]:
+                        best = (delta, u, u2, v, v2)
+        _, u, u2, v, v2 = best
+        adj[u].remove(u2)
+        adj[u2].remove(u)
+        adj[v].remove(v2)
+        adj[v2].remove(v)
+        adj[u].append(v)
+        adj[v].append(u)
+        adj[u2].append(v2)
+        adj[v2].append(u2)
+        target = comp[v]
+        for city in members[small]:
+            comp[city] = target
+        members[target].extend(members[small])
+        alive.discard(small)
+
+def eax_crossover(parent1, parent2, dists, seed=0, k=EAX_NEIGHBORS):
+    '''
+    Edge assembly crossover (EAX, single AB-cycle): replace the parent1 edges of one random AB-cycle with its
+    parent2 edges, then join the resulting subtours greedily. The child is made almost entirely of parent edges.
+
+    :param dists: Distances backend, used to join subtours.
+    :param seed: seed for the choice of the AB-cycle.
+    :return: child as an integer array.
+    '''
+    dtype = np.asarray(parent1).dtype
+    p1 = np.asarray(parent1).tolist()
+    p2 = np.asarray(parent2).tolist()
+    n = len(p1)
+    if n < 5:
+        return np.array(p1, dtype=dtype)
+    rnd = random.Random(seed)
+    adjA = [None] * n
+    adjB = [None] * n
+    for tour, adj in ((p1, adjA), (p2, adjB)):
+        for i, city in enumerate(tour):
+            adj[city] = [tour[i - 1], tour[i + 1 - n]]
+    # Shared edges never take part in an AB-cycle
+    freeA = [[x for x in adjA[c] if x not in adjB[c]] for c in range(n)]
+    freeB = [[x for x in adjB[c] if x not in adjA[c]] for c in range(n)]
+    cycles = _ab_cycles(freeA, freeB, rnd)
+    if not cycles:
+        return np.array(p1, dtype=dtype)
+    cycle = cycles[rnd.randrange(len(cycles))]
+    child = [list(pair) for pair in adjA]
+    m = len(cycle)
+    for i in range(0, m, 2):
+        a, b = cycle[i], cycle[i + 1]
+        child[a].remove(b)
+        child[b].remove(a)
+    for i in range(1, m, 2):
+        a, b = cycle[i], cycle[(i + 1) % m]
+        child[a].append(b)
+        child[b].append(a)
+    _merge_subtours(child, dists, dists.neighbors(k).tolist())
+    tour = [0]
+    prev, cur = 0, child[0][0]
+    while cur != 0:
+        tour.append(cur)
+        prev, cur = cur, child[cur][1] if child[cur][0] == prev else child[cur][0]
+    return np.array(tour, dtype=dtype)
+
+def _eax_batch(parents1, parents2, cuts, dists=None):
+    ''' EAX for every pair, the cut points seed the choice of AB-cycle '''
+    if dists is None:
+        raise ValueError("EAX needs the distances to join subtours")
+    children = np.empty_like(parents1)
+    n = parents1.shape[1]
+    for i in range(len(parents1)):
+        children[i] = eax_crossover(parents1[i], parents2[i], dists, seed=int(cuts[i, 0]) * n + int(cuts[i, 1]))
+    return children
+
+def _order_crossover_batch(parents1, parents2, cuts, dists=None):
+    ''' OX for a whole batch at once, one child per row '''
+    count, n = parents1.shape
+    rows = np.arange(count)[:, None]
+    cols = np.arange(n)[None, :]
+    inSlice = (cols >= cuts[:, :1]) & (cols <= cuts[:, 1:])
+    child = np.where(inSlice, parents1, 0).astype(parents1.dtype)
+    # visited[b, city]: city already placed from parent1's slice
+    visited = np.zeros((count, n), dtype=bool)
+    visited[rows, parents1] = inSlice
+    keep = ~visited[rows, parents2]
+    keepRows, keepCols = np.nonzero(keep)
+    rank = (np.cumsum(keep, axis=1) - 1)[keepRows, keepCols]
+    target = (cuts[keepRows, 1] + 1 + rank) % n
+    child[keepRows, target] = parents2[keepRows, keepCols]
+    return child
+
+def _per_child(operator):
+    ''' Batch version of a single-child operator '''
+    def batch(parents1, parents2, cuts, dists=None):
+        children = np.empty_like(parents1)
+        for i in range(len(parents1)):
+            children[i] = operator(parents1[i], parents2[i], cuts[i, 0], cuts[i, 1])
+        return children
+    return batch
+
+# Batch crossover operators selectable by name
+CROSSOVERS = {
+    "ox": _order_crossover_batch,
+    "pmx": _per_child(pmx_crossover),
+    "cx": _per_child(cycle_crossover),
+    "eax": _eax_batch,
+}
+
+def crossover_batch(population, parents, cuts, operator="ox", dists=None):
+    '''
+    Children for many parent pairs in one call.
+
+    :param population: (pop_size, n) integer array.
+    :param parents: (count, 2) population indexes of the parents.
+    :param cuts: (count, 2) sorted cut points, inclusive.
+    :param operator: name from CROSSOVERS.
+    :param dists: Distances backend, needed by "eax".
+    :return: (count, n) array of children.
+    '''
+    parents = np.asarray(parents)
+    cuts = np.asarray(cuts)
+    if len(parents) == 0:
+        return np.empty((0, population.shape[1]), dtype=population.dtype)
+    return CROSSOVERS[operator](population[parents[:, 0]], population[parents[:, 1]], cuts, dists)
+
+def compare(population, dists, count=100, seed=0, operators=None):
+    '''
+    Run several crossover operators on the same parents and cut points.
+
+    :return: {operator: {"seconds": ..., "mean_length": ...}}.
+    '''
+    rng = np.random.default_rng(seed)
+    popSize, n = population.shape
+    parents = rng.integers(0, popSize, size=(count, 2))
+    cuts = np.sort(np.stack([rng.permutation(n)[:2] for _ in range(count)]), axis=1)
+    results = {}
+    for name in operators or CROSSOVERS:
+        start_time = time.time()
+        children = crossover_batch(population, parents, cuts, name, dists)
+        results[name] = {
+            "seconds": round(time.time() - start_time, 4),
+            "mean_length": round(float(dists.tour_lengths(children).mean()), 3),
+        }
+    return results
@@ -0,0 +1,181 @@
+import math
+import numpy as np
+
+# Memory allowed for a precomputed matrix before falling back to on-demand blocks
+MAX_MATRIX_BYTES = 512 * 1024 * 1024
+# Matrix entries computed at once when working block by block
+BLOCK_SIZE = 1 << 20
+
+class Distances():
+    ''' Euclidean distance backend shared by every tour-length and neighbor query '''
+
+    def __init__(self, cities, mode="auto", dtype=np.float64, maxBytes=MAX_MATRIX_BYTES, storage=None):
+        '''
+        Build the distance backend.
+
+        :param cities: (n, 3) coordinates, list of lists or array.
+        :param mode: "dense" (n*n matrix), "condensed" (upper triangle only), "blocked" (on demand) or "auto".
+        :param dtype: float type of the stored matrix, np.float32 halves memory.
+        :param maxBytes: memory budget used by "auto" to pick a mode.
+        :param storage: already computed matrix ("dense") or upper triangle ("condensed") to use as is,
+            e.g. an array over shared memory.
+        '''
+        self.coords = np.asarray(cities, dtype=np.float64).reshape(-1, 3)
+        self.points = [tuple(p) for p in self.coords.tolist()]
+        self.n = len(self.coords)
+        self.dtype = np.dtype(dtype)
+        self._neighbors = None
+        self._candidates = None
+
+        n = self.n
+        itemSize = self.dtype.itemsize
+        if mode == "auto":
+            if n * n * itemSize <= maxBytes:
+                mode = "dense"
+            elif n * (n - 1) // 2 * itemSize <= maxBytes:
+                mode = "condensed"
+            else:
+                mode = "blocked"
+        if mode not in ("dense", "condensed", "blocked"):
+            raise ValueError("Unknown distance mode: " + str(mode))
+        self.mode = mode
+
+        self.matrix = None
+        self.condensed = None
+        if storage is not None and mode != "blocked":
+            self.dtype = storage.dtype
+            if mode == "dense":
+                self.matrix = storage
+            else:
+                self.condensed = storage
+        elif mode == "dense":
+            self.matrix = np.empty((n, n), dtype=self.dtype)
+            step = self._block_rows()
+            for start in range(0, n, step):
+                end = min(n, start + step)
+                self.matrix[start:end] = self._block(start, end)
+        elif mode == "condensed":
+            self.condensed = np.empty(n * (n - 1) // 2, dtype=self.dtype)
+            for i in range(n - 1):
+                offset = self._offset(i)
+                diff = self.coords[i + 1:] - self.coords[i]
+                self.condensed[offset:offset + n - i - 1] = np.sqrt(np.einsum("ij,ij->i", diff, diff))
+
+    @property
+    def storage(self):
+        ''' Precomputed distances, the matrix or the upper triangle, None when computed on demand '''
+        return self.matrix if self.mode == "dense" else self.condensed
+
+    def _block_rows(self):
+        ''' Number of rows per block so a block stays within BLOCK_SIZE entries '''
+        return max(1, BLOCK_SIZE // max(1, self.n))
+
+    def _offset(self, i):
+        ''' Start of row i in the condensed upper triangle '''
+        return i * self.n - i * (i + 1) // 2
+
+    def _block(self, start, end):
+        ''' Distances from cities start..end-1 to every city '''
+        diff = self.coords[start:end, None, :] - self.coords[None, :, :]
+        return np.sqrt(np.einsum("ijk,ijk->ij", diff, diff))
+
+    def dist(self, i, j):
+        ''' Distance between two cities as a python float '''
+        if self.mode == "dense":
+            return self.matrix.item(i, j)
+        if self.mode == "condensed" and i != j:
+            if i > j:
+                i, j = j, i
+            return self.condensed.item(self._offset(i) + j - i - 1)
+        return math.dist(self.points[i], self.points[j])
+
+    def row(self, i):
+        ''' Distances from city i to every city '''
+        if self.mode == "dense":
+            return self.matrix[i].astype(np.float64)
+        diff = self.coords - self.coords[i]
+        return np.sqrt(np.einsum("ij,ij->i", diff, diff))
+
+    def pairs(self, a, b):
+        ''' Vectorized distances between index arrays a and b '''
+        a = np.asarray(a)
+        b = np.asarray(b)
+        if self.mode == "dense":
+            return self.matrix[a, b].astype(np.float64)
+        if self.mode == "condensed":
+            lo = np.minimum(a, b)
+            hi = np.maximum(a, b)
+            idx = lo * self.n - lo * (lo + 1) // 2 + hi - lo - 1
+            out = self.condensed[np.maximum(idx, 0)].astype(np.float64)
+            out[lo == hi] = 0.0
+            return out
+        diff = self.coords[a] - self.coords[b]
+        return np.sqrt(np.einsum("...k,...k->...", diff, diff))
+
+    def tour_length(self, path):
+        ''' Length of the closed tour visiting path in order '''
+        path = np.asarray(path)
+        if len(path) < 2:
+            return 0.0
+        return float(self.pairs(path, np.roll(path, -1)).sum())
+
+    def tour_lengths(self, population):
+        '''
+        Lengths of many closed tours at once.
+
+        :param population: (pop_size, n) integer array, one tour per row.
+        :return: float array of tour lengths.
+        '''
+        population = np.asarray(population)
+        nextCity = np.roll(population, -1, axis=1)
+        if self.mode == "dense":
+            return self.matrix[population, nextCity].sum(axis=1, dtype=np.float64)
+        # Bound the temporary coordinate arrays by gathering a block of tours at a time
+        step = self._block_rows()
+        lengths = np.empty(len(population))
+        for start in range(0, len(population), step):
+            end = start + step
+            lengths[start:end] = self.pairs(population[start:end], nextCity[start:end]).sum(axis=1)
+        return lengths
+
+    def set_candidates(self, candidates):
+        ''' Install candidate lists (e.g. alpha-nearness) that local search uses instead of the nearest neighbors '''
+        self._candidates = None if candidates is None else np.asarray(candidates, dtype=np.int64)
+
+    def candidates(self, k):
+        ''' k candidate cities per city for local search: the installed lists when long enough, else neighbors(k) '''
+        if self._candidates is not None and self._candidates.shape[1] >= min(k, self.n - 1):
+            return self._candidates[:, :k]
+        return self.neighbors(k)
+
+    def neighbors(self, k):
+        '''
+        k nearest neighbors of every city, closest first.
+
+        :param k: number of neighbors per city.
+        :return: (n, k) integer array.
+        '''
+        k = max(0, min(k, self.n - 1))
+        if self._neighbors is not None and self._neighbors.shape[1] >= k:
+            return self._neighbors[:, :k]
+        n = self.n
+        if self.mode == "blocked":
+            # Too many cities for full rows, ask a spatial grid with about k cities per cell instead
+            from construction import PointGrid
+            self._neighbors = PointGrid(self.coords, perCell=max(1, k)).knn_all(k)
+            return self._neighbors
+        result = np.empty((n, k), dtype=np.int64)
+        step = self._block_rows()
+        for start in range(0, n, step):
+            end = min(n, start + step)
+            block = self.matrix[start:end].astype(np.float64) if self.mode == "dense" else self._block(start, end)
+            block[np.arange(end - start), np.arange(start, end)] = np.inf
+            if k < n - 1:
+                cand = np.argpartition(block, k, axis=1)[:, :k]
+            else:
+                cand = np.tile(np.arange(n), (end - start, 1))
+                cand = cand[cand != np.arange(start, end)[:, None]].reshape(end - start, n - 1)
+            order = np.argsort(np.take_along_axis(block, cand, axis=1), axis=1, kind="stable")
+            result[start:end] = np.take_along_axis(cand, order, axis=1)
+        self._neighbors = result
+        return result
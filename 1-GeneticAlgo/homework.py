@@ -1,138 +1,251 @@
-import math, random, time
+import argparse, math, random
+import numpy as np
+from distance import Distances
+from construction import NNTourCache, greedy_edge_tour, nearest_neighbor_tour, space_filling_tour
+from crossover import CROSSOVERS, crossover_batch
+from tsp_io import load_cities, write_tour
+from budget import Checkpoint, Deadline
+from cache import TourCache, unique_tours
+from local_search import NEIGHBORS, two_opt, run_pipeline, format_report
+from lower_bound import HeldKarp
+from profiling import Profiler, timer
+from warm_start import warm_start
+
+# Instances above this size are solved by cluster decomposition unless a cluster size is given
+CLUSTER_CITIES = 20000
+# Seconds of subgradient optimization spent on the Held-Karp bound
+BOUND_SECONDS = 30
+
+rng = np.random.default_rng()
 
 def read_input(filename="input.txt"):
-    f = open(filename, "r")
-    citiesNum = int(f.readline())
-    
-    cities = []
-    for _ in range(citiesNum):
-        cities.append(list(map(int, f.readline().strip().split())))
-
-    f.close()
-    return cities, citiesNum
+    cities = load_cities(filename)
+    return cities, len(cities)
 
 def write_output(cities, path, dist, filename="output.txt"):
-    f = open(filename, "w")
-    f.write(str(dist) + "\n")
-    for ind in path:
-        f.write(" ".join(map(str, cities[ind])) + "\n")
-    f.close()
+    write_tour(cities, path, dist, filename)
     return
 
-def euclidean_dist(city1, city2):
-    return math.sqrt(sum((i - j) ** 2 for i, j in zip(city1, city2)))
-
-def path_dist(path, cities):
-    pathCalc = path[:]
-    pathCalc.append(path[0])
-    distSum = 0
-    for i in range(len(pathCalc) - 1):
-        distSum += euclidean_dist(cities[pathCalc[i]], cities[pathCalc[i+1]])
+def path_dist(path, dists):
+    distSum = dists.tour_length(path)
     distSum = round(distSum, 3)
     return distSum
 
-def crossover(parent1, parent2, startInd, endInd):
-    child = [None] * len(parent1)
-    child[startInd:endInd+1] = parent1[startInd:endInd+1]
-    ptr = (endInd + 1) % len(parent2)
-    for city in parent2:
-        if city not in child:
-            child[ptr] = city
-            ptr = (ptr + 1) % len(parent2)
-    return child
-
-def two_opt(path, cities, time_limit=1):
-    start_time = time.time()
-    improved = True
-    while improved:
-        improved = False
-        for i in range(1, len(path) - 2):
-            for j in range(i + 1, len(path)):
-                if j - i == 1:
-                    continue
-                new_path = path[:]
-                new_path[i:j] = path[j - 1:i - 1:-1]
-                if path_dist(new_path, cities) < path_dist(path, cities):
-                    path = new_path
-                    improved = True
-                if time.time() - start_time > time_limit:
-                    return path
-    return path
-
-def gen_path(cities, citiesNum):
+def gen_path(dists, citiesNum, cache=None):
     start = random.randint(0, citiesNum - 1)
-    path = [start]
-    unvisited = set(range(citiesNum)) - {start}
-    while unvisited:
-        currentCity = path[-1]
-        nextCity = min(unvisited, key=lambda city: euclidean_dist(cities[currentCity], cities[city]))
-        path.append(nextCity)
-        unvisited.remove(nextCity)
-    return path
+    if cache is None:
+        return nearest_neighbor_tour(dists.coords, start)
+    return cache.get(start)
 
 def gen_path_random(citiesNum):
     path = list(range(citiesNum))
     random.shuffle(path)
     return path
 
-def gen_init_population(cities, citiesNum, size=50):
-    population = []
-    for _ in range(size):
-        if random.random() < 0.5:
-            population.append(gen_path(cities, citiesNum))
+def gen_init_population(dists, citiesNum, size=50, deadline=None, checkpoint=None, profiler=None, seeds=None):
+    population = np.empty((size, citiesNum), dtype=np.int32)
+    cache = NNTourCache(dists.coords)
+    # Seed the given tours plus one greedy-edge and one space-filling-curve tour, the rest as before
+    seeds = (list(seeds or []) + [greedy_edge_tour(dists), space_filling_tour(dists.coords)])[:size]
+    for i, seed in enumerate(seeds):
+        population[i] = seed
+        if checkpoint:
+            checkpoint.offer(seed)
+    for i in range(len(seeds), size):
+        # Out of construction time: fill up with cheap random tours
+        if random.random() < 0.5 and not (deadline and deadline.expired("construction")):
+            population[i] = gen_path(dists, citiesNum, cache)
         else:
-            population.append(gen_path_random(citiesNum))
+            population[i] = gen_path_random(citiesNum)
+    if profiler:
+        profiler.count("nn_cache_hits", cache.hits)
+        profiler.count("nn_cache_misses", cache.misses)
     return population
 
-def fitness(population, cities):
-    fitnessScores = [path_dist(path, cities) for path in population]
-    fitnessValues = [1 / (d ** 2) if d > 0 else 1e9 for d in fitnessScores]
-    totalFitness = sum(fitnessValues)
-    probabilities = [f / totalFitness for f in fitnessValues]
+def fitness(population, dists, cache=None):
+    lengths = cache.tour_lengths(population, dists) if cache else dists.tour_lengths(population)
+    fitnessScores = np.round(lengths, 3)
+    fitnessValues = np.full(len(fitnessScores), 1e9)
+    positive = fitnessScores > 0
+    fitnessValues[positive] = 1 / fitnessScores[positive] ** 2
+    probabilities = fitnessValues / fitnessValues.sum()
     return fitnessScores, probabilities
 
-def select_parents(fitnessScores, probabilities, size=3):
-    parents = []
-    for _ in range(2):
-        tournament = random.sample(range(len(fitnessScores)), size)
-        winner = min(tournament, key=lambda i: fitnessScores[i])
-        parents.append(winner)
-    return parents
-
-def gen_new_population(population, cities, children=100):
-    fitnessScores, probabilities = fitness(population, cities)
-    sortedInd = sorted(range(len(fitnessScores)), key=lambda i: fitnessScores[i])
-    newPop = [population[i] for i in sortedInd[:max(1, len(population) // 20)]]
-    for i in range(len(newPop)):
-        newPop[i] = two_opt(newPop[i], cities, time_limit=10)
-    while len(newPop) < children:
-        parents = select_parents(fitnessScores, probabilities)
-        start, end = sorted(random.sample(range(len(population[0])), 2))
-        child = crossover(population[parents[0]], population[parents[1]], start, end)
-        newPop.append(child)
+def select_parents(fitnessScores, probabilities, size=3, pairs=1):
+    count = len(fitnessScores)
+    size = min(size, count)
+    tournament = rng.integers(0, count, size=(pairs * 2, size))
+    # Members of a tournament are distinct: redraw any that repeat an earlier member of their row
+    for j in range(1, size):
+        clash = (tournament[:, j:j+1] == tournament[:, :j]).any(axis=1)
+        while clash.any():
+            tournament[clash, j] = rng.integers(0, count, size=int(clash.sum()))
+            clash = (tournament[:, j:j+1] == tournament[:, :j]).any(axis=1)
+    winners = tournament[np.arange(pairs * 2), np.argmin(fitnessScores[tournament], axis=1)]
+    return winners.reshape(pairs, 2)
+
+def gen_new_population(population, dists, children=100, operator="ox", deadline=None, cache=None, profiler=None):
+    # Identical individuals would be scored, selected and polished more than once
+    with timer(profiler, "fitness"):
+        unique = unique_tours(population)
+        if profiler:
+            profiler.count("duplicates_dropped", len(population) - len(unique))
+        population = population[unique]
+        fitnessScores, probabilities = fitness(population, dists, cache)
+    sortedInd = np.argsort(fitnessScores, kind="stable")
+    eliteNum = max(1, len(population) // 20)
+    newPop = np.empty((max(eliteNum, math.ceil(children)), population.shape[1]), dtype=population.dtype)
+    with timer(profiler, "2opt"):
+        for i in range(eliteNum):
+            timeLimit = deadline.limit(10, "evolution") if deadline else 10
+            newPop[i] = two_opt(population[sortedInd[i]], dists, time_limit=timeLimit) if timeLimit > 0 else population[sortedInd[i]]
+    childNum = len(newPop) - eliteNum
+    with timer(profiler, "selection"):
+        parents = select_parents(fitnessScores, probabilities, pairs=childNum)
+    with timer(profiler, "crossover"):
+        # Two distinct cut points per child
+        first = rng.integers(0, population.shape[1], size=childNum)
+        second = rng.integers(0, population.shape[1] - 1, size=childNum)
+        second += second >= first
+        cuts = np.sort(np.stack([first, second], axis=1), axis=1)
+        newPop[eliteNum:] = crossover_batch(population, parents, cuts, operator, dists)
     return newPop
 
-def select_best(population, cities):
-    for i in range(len(population)):
-        population[i] = two_opt(population[i], cities, time_limit=10)
-    fitnessScores = [path_dist(path, cities) for path in population]
-    bestInd = fitnessScores.index(min(fitnessScores))
-    solPath = population[bestInd][:]
-    solPath.append(population[bestInd][0])
-    solPath = two_opt(solPath, cities, time_limit=180)
+def select_best(population, dists, deadline=None, checkpoint=None, cache=None, profiler=None, target=None):
+    # Polishing every individual may use at most half of the polish phase, the rest goes to the best one
+    reserve = deadline.remaining("polish") / 2 if deadline and deadline.total is not None else -1
+    with timer(profiler, "2opt"):
+        for i in range(len(population)):
+            if deadline and deadline.remaining("polish") <= reserve:
+                break
+            if target and checkpoint and checkpoint.bestLength <= target:
+                break
+            population[i] = two_opt(population[i], dists, time_limit=deadline.limit(10, "polish") if deadline else 10)
+    with timer(profiler, "fitness"):
+        fitnessScores = fitness(population, dists, cache)[0]
+    bestInd = int(np.argmin(fitnessScores))
+    if checkpoint:
+        checkpoint.offer(population[bestInd])
+    with timer(profiler, "polish"):
+        solPath, report = run_pipeline(population[bestInd], dists,
+                                       time_limit=deadline.limit(180, "polish") if deadline else 180, target=target)
+    print(format_report(report))
+    if profiler:
+        for stage in report:
+            profiler.event("polish", **stage)
+    solPath.append(solPath[0])
     return solPath
 
-def main():
-    cities, citiesNum = read_input()
-    paths = gen_init_population(cities, citiesNum, citiesNum*3)
-    for cycle in range(10):
+def checkpoint_best(population, dists, checkpoint, cache=None):
+    fitnessScores = fitness(population, dists, cache)[0]
+    checkpoint.offer(population[int(np.argmin(fitnessScores))])
+    return fitnessScores
+
+def evolve(dists, citiesNum, deadline, checkpoint, operator="ox", cache=None, profiler=None, seeds=None, target=None,
+           generations=10):
+    ''' Single-population GA: initial population, then up to generations rounds of selection and crossover '''
+    with timer(profiler, "init"):
+        paths = gen_init_population(dists, citiesNum, citiesNum*3, deadline, checkpoint, profiler, seeds)
+    scores = checkpoint_best(paths, dists, checkpoint, cache)
+    if profiler:
+        profiler.generation(0, scores)
+    for cycle in range(generations):
+        if deadline.expired("evolution") or (target and checkpoint.bestLength <= target):
+            break
         print(str(cycle + 1))
-        paths = gen_new_population(paths, cities, citiesNum/2)
-    path = select_best(paths, cities)
-    dist = path_dist(path, cities)
-    print("Path Distance: " + str(dist))
-    write_output(cities, path, dist)
+        paths = gen_new_population(paths, dists, citiesNum/2, operator, deadline, cache, profiler)
+        scores = checkpoint_best(paths, dists, checkpoint, cache)
+        if profiler:
+            profiler.generation(cycle + 1, scores)
+    return paths
+
+def main(islands=1, interval=2, topology="ring", operator="ox", budget=None, clusterSize=None, trace=None, profile=None,
+         warm=None, gap=None, alpha=False):
+    deadline = Deadline(budget)
+    # Instrumentation is off unless a trace or profile file is asked for
+    profiler = Profiler(trace, profile) if trace or profile else None
+    with timer(profiler, "read"):
+        cities, citiesNum = read_input()
+        dists = Distances(cities)
+    if profiler:
+        profiler.event("instance", cities=citiesNum, distance_mode=dists.mode)
+    # Best-so-far tour is kept in output.txt from the first population on
+    checkpoint = Checkpoint(cities, dists)
+    cache = TourCache()
+    seeds = []
+    if warm:
+        # Repair the previous tour and re-optimize around the changes first, it is on disk within seconds
+        with timer(profiler, "warm"):
+            result = warm_start(warm, cities, dists, time_limit=deadline.limit(60, "construction"))
+        if result is None:
+            print("Warm start: no city of " + warm + " is in the instance")
+        else:
+            path, info = result
+            print("Warm start: " + str(info))
+            if profiler:
+                profiler.event("warm", **info)
+            checkpoint.offer(path)
+            seeds.append(path)
+    # Stop early once the best tour is within gap of the Held-Karp bound
+    target = None
+    if gap is not None or alpha:
+        heldKarp = HeldKarp(dists)
+        with timer(profiler, "bound"):
+            bound = heldKarp.solve(time_limit=deadline.limit(BOUND_SECONDS, "construction"))
+        print("Lower bound: " + str(round(bound, 3)) + ("" if heldKarp.exact else " (estimate)"))
+        if profiler:
+            profiler.event("bound", bound=round(bound, 3), exact=heldKarp.exact, iterations=heldKarp.iterations)
+        # An estimate may overshoot the optimum, only a true bound can end the search
+        if gap is not None and heldKarp.exact:
+            target = bound * (1 + gap)
+        if alpha:
+            dists.set_candidates(heldKarp.candidates(NEIGHBORS))
+    if clusterSize or (clusterSize is None and citiesNum > CLUSTER_CITIES):
+        from cluster import CLUSTER_SIZE, solve_clustered
+        with timer(profiler, "cluster"):
+            path = solve_clustered(cities, dists, maxSize=clusterSize or CLUSTER_SIZE, deadline=deadline)
+        checkpoint.offer(path)
+        if profiler:
+            profiler.close(length=checkpoint.bestLength)
+        print("Path Distance: " + str(checkpoint.bestLength))
+        return
+    if islands > 1:
+        from islands import run_islands
+        # Islands run in their own processes, only their total time is recorded
+        with timer(profiler, "islands"):
+            paths, rate = run_islands(cities, islands=islands, generations=10, interval=interval, topology=topology,
+                                      operator=operator, deadline=deadline, checkpoint=checkpoint,
+                                      dists=dists, seeds=seeds, target=target)
+        print("Generations/s: " + str(round(rate, 2)))
+        for path in paths:
+            checkpoint.offer(path)
+    else:
+        paths = evolve(dists, citiesNum, deadline, checkpoint, operator, cache, profiler, seeds, target)
+    path = select_best(paths, dists, deadline, checkpoint, cache, profiler, target)
+    checkpoint.offer(path)
+    if profiler:
+        profiler.close(length=checkpoint.bestLength, cache=cache.stats(), checkpoint_writes=checkpoint.writes)
+    print("Fitness cache: " + str(cache.stats()))
+    if gap is not None or alpha:
+        print("Gap to lower bound: " + str(round(checkpoint.bestLength / bound - 1, 5)))
+    print("Path Distance: " + str(checkpoint.bestLength))
     return
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--islands", "-i", type=int, help="number of island processes", default=1)
+    parser.add_argument("--interval", type=int, help="generations between migrations", default=2)
+    parser.add_argument("--topology", choices=("ring", "full", "random"), help="migration topology", default="ring")
+    parser.add_argument("--crossover", choices=sorted(CROSSOVERS), help="crossover operator", default="ox")
+    parser.add_argument("--budget", "-b", type=float, help="total wall-clock budget in seconds", default=None)
+    parser.add_argument("--cluster-size", type=int,
+                        help="solve clusters of at most this many cities and stitch them, 0 to disable", default=None)
+    parser.add_argument("--trace", help="write a JSON-lines trace of timers, counters and generations", default=None)
+    parser.add_argument("--profile", help="write a cProfile dump of the run", default=None)
+    parser.add_argument("--warm", help="previous output file to repair and start from", default=None)
+    parser.add_argument("--gap", type=float, help="stop once within this relative gap of the Held-Karp bound", default=None)
+    parser.add_argument("--alpha", action="store_true", help="use alpha-nearness candidates in local search")
+    args = parser.parse_args()
+
+    main(args.islands, args.interval, args.topology, args.crossover, args.budget, args.cluster_size,
+         args.trace, args.profile, args.warm, args.gap, args.alpha)
\ No newline at end of file
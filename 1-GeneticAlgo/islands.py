@@ -0,0 +1,244 @@
+import os, random, time
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+
+import homework
+from cache import TourCache
+from distance import Distances
+
+# Ways islands pick the islands they receive migrants from
+TOPOLOGIES = ("ring", "full", "random")
+# Seconds between looks at the published tours while the islands run
+CHECKPOINT_POLL = 0.5
+
+def migration_sources(index, islands, topology, rng):
+    '''
+    Islands that send migrants to a given island.
+
+    :param index: receiving island.
+    :param islands: number of islands.
+    :param topology: "ring" (previous island), "full" (every other island) or "random" (one random island).
+    :return: list of island indexes.
+    '''
+    if islands < 2:
+        return []
+    if topology == "ring":
+        return [(index - 1) % islands]
+    if topology == "full":
+        return [i for i in range(islands) if i != index]
+    if topology == "random":
+        source = int(rng.integers(0, islands - 1))
+        return [source + (source >= index)]
+    raise ValueError("Unknown migration topology: " + str(topology))
+
+def _shared_views(buf, islands, migrants, citiesNum):
+    ''' Arrays laid over the shared block: migrant tours, their lengths and generation counters '''
+    tours = np.ndarray((islands, migrants, citiesNum), dtype=np.int32, buffer=buf)
+    offset = tours.nbytes
+    lengths = np.ndarray((islands, migrants), dtype=np.float64, buffer=buf, offset=offset)
+    offset += lengths.nbytes
+    # One extra slot: set when any island ran past the deadline
+    generations = np.ndarray((islands + 1,), dtype=np.int64, buffer=buf, offset=offset)
+    return tours, lengths, generations
+
+def _share_distances(dists):
+    '''
+    Copy the precomputed distances into shared memory, so islands do not each build their own.
+
+    :return: shared block (None when distances are computed on demand) and the spec islands attach with.
+    '''
+    storage = dists.storage
+    # Installed candidate lists (--alpha) are small enough to go with the spec
+    candidates = dists._candidates
+    if storage is None:
+        return None, (dists.mode, dists.dtype.str, None, None, candidates)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, storage.nbytes))
+    np.ndarray(storage.shape, dtype=storage.dtype, buffer=shm.buf)[:] = storage
+    return shm, (dists.mode, storage.dtype.str, storage.shape, shm.name, candidates)
+
+def _attach_distances(cities, spec):
+    ''' Distances over the shared block described by spec, and the block to close once done with them '''
+    mode, dtype, shape, name, candidates = spec
+    shm = None
+    if name is None:
+        dists = Distances(cities, mode=mode, dtype=dtype)
+    else:
+        shm = shared_memory.SharedMemory(name=name)
+        storage = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        dists = Distances(cities, mode=mode, dtype=dtype, storage=storage)
+    dists.set_candidates(candidates)
+    return dists, shm
+
+def _island_worker(index, cities, config, shmName, barrier, seed):
+    ''' Process entry point: attach to the shared blocks and evolve one island '''
+    shm = shared_memory.SharedMemory(name=shmName)
+    dists, distShm = _attach_distances(cities, config["distances"])
+    try:
+        _evolve(index, dists, config, shm.buf, barrier, seed)
+    except BaseException:
+        # Release islands blocked on the barrier instead of leaving them hanging
+        barrier.abort()
+        raise
+    shm.close()
+    if distShm:
+        # The views over the block have to go before it can be closed
+        del dists
+        distShm.close()
+
+def _publish(index, population, dists, cache, tours, lengths):
+    '''
+    Write an island's best tours to its slots of the shared block.
+
+    :return: population indexes sorted from best to worst.
+    '''
+    scores = homework.fitness(population, dists, cache)[0]
+    order = np.argsort(scores, kind="stable")
+    send = min(tours.shape[1], len(population))
+    tours[index, :send] = population[order[:send]]
+    lengths[index, :send] = scores[order[:send]]
+    lengths[index, send:] = np.inf
+    return order
+
+def _evolve(index, dists, config, buf, barrier, seed):
+    ''' Evolve one subpopulation, exchanging best tours with other islands every interval generations '''
+    random.seed(seed)
+    homework.rng = np.random.default_rng(seed)
+    rng = np.random.default_rng(seed + 1)
+    islands = config["islands"]
+    migrants = config["migrants"]
+    citiesNum = dists.n
+    tours, lengths, generations = _shared_views(buf, islands, migrants, citiesNum)
+
+    deadline = config["deadline"]
+    cache = TourCache()
+    # Warm-start tours go to the first island only, migration spreads them
+    seeds = config["seeds"] if index == 0 else None
+    population = homework.gen_init_population(dists, citiesNum, config["pop_size"], deadline, seeds=seeds)
+    # Early tours for the checkpoint, no island reads them before the first migration overwrites them
+    _publish(index, population, dists, cache, tours, lengths)
+    for gen in range(config["generations"]):
+        population = homework.gen_new_population(population, dists, config["children"], config["operator"], deadline, cache)
+        generations[index] = gen + 1
+        if (gen + 1) % config["interval"] or gen + 1 == config["generations"]:
+            continue
+        if deadline and deadline.expired("evolution"):
+            generations[islands] = 1
+        # Publish the best tours, wait for every island, then take in the neighbors' best
+        order = _publish(index, population, dists, cache, tours, lengths)
+        if config["target"] and lengths[index, 0] <= config["target"]:
+            generations[islands] = 1
+        barrier.wait()
+        # Every island reads the stop flag after the same barrier, so they all leave together
+        stop = generations[islands] != 0
+        incoming = []
+        for source in migration_sources(index, islands, config["topology"], rng):
+            for m in range(migrants):
+                if np.isfinite(lengths[source, m]):
+                    incoming.append(tours[source, m].copy())
+        barrier.wait()
+        # Migrants replace the worst individuals, the island's best is always kept
+        incoming = incoming[:max(0, len(population) - 1)]
+        for slot, tour in zip(order[::-1], incoming):
+            population[slot] = tour
+        if stop:
+            break
+
+    scores = homework.fitness(population, dists, cache)[0]
+    best = int(np.argmin(scores))
+    tours[index, 0] = population[best]
+    lengths[index, 0] = scores[best]
+
+def _offer_published(tours, lengths, checkpoint):
+    ''' Offer the best tour the islands have published to the checkpoint '''
+    published = np.where(np.isfinite(lengths), lengths, np.inf)
+    island, slot = np.unravel_index(np.argmin(published), published.shape)
+    if published[island, slot] >= checkpoint.bestLength:
+        return
+    tour = tours[island, slot].copy()
+    # An island may be rewriting the tour, only a whole permutation is offered
+    if np.array_equal(np.sort(tour), np.arange(len(tour))):
+        checkpoint.offer(tour)
+
+def _run_workers(cities, config, shm, seed, checkpoint=None):
+    ''' Start one process per island and collect the best tour of each '''
+    islands = config["islands"]
+    tours, lengths, generations = _shared_views(shm.buf, islands, config["migrants"], len(cities))
+    lengths[:] = np.inf
+    generations[:] = 0
+    barrier = mp.Barrier(islands)
+    start_time = time.time()
+    workers = [
+        mp.Process(target=_island_worker, args=(i, cities, config, shm.name, barrier, seed + 2 * i))
+        for i in range(islands)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        # Tours published at every migration reach the checkpoint while the islands run
+        while worker.is_alive():
+            worker.join(CHECKPOINT_POLL if checkpoint else None)
+            if checkpoint:
+                _offer_published(tours, lengths, checkpoint)
+    elapsed = time.time() - start_time
+    failed = [i for i, worker in enumerate(workers) if worker.exitcode != 0]
+    if failed:
+        raise RuntimeError("Island workers failed: " + ", ".join(map(str, failed)))
+    rate = float(generations[:islands].sum()) / elapsed if elapsed > 0 else 0.0
+    return tours[:, 0].copy(), rate
+
+def run_islands(cities, islands=None, generations=10, interval=2, topology="ring", migrants=2,
+                pop_size=None, children=None, operator="ox", deadline=None, seed=None, checkpoint=None, dists=None,
+                seeds=None, target=None):
+    '''
+    Island-model GA, one worker process per island.
+
+    :param cities: city coordinates.
+    :param islands: number of islands, defaults to the number of CPU cores.
+    :param generations: generations evolved by every island.
+    :param interval: generations between migrations.
+    :param topology: one of TOPOLOGIES.
+    :param migrants: best tours each island publishes per migration.
+    :param pop_size: initial population per island, defaults to the serial size split across islands.
+    :param children: population per island after the first generation, split the same way.
+    :param operator: crossover operator name.
+    :param deadline: Deadline bounding construction, islands stop at the first migration past the evolution phase.
+    :param checkpoint: Checkpoint offered the best published tour every CHECKPOINT_POLL seconds.
+    :param dists: Distances of the cities, shared with every island, built here if not given.
+    :param seeds: tours placed in the initial population of the first island.
+    :param target: islands stop at the first migration where one of them reaches this length.
+    :return: (islands, n) array with the best tour of every island, and generations per second over all islands.
+    '''
+    citiesNum = len(cities)
+    islands = islands or os.cpu_count() or 1
+    if topology not in TOPOLOGIES:
+        raise ValueError("Unknown migration topology: " + str(topology))
+    config = {
+        "islands": islands,
+        "generations": generations,
+        "interval": max(1, interval),
+        "topology": topology,
+        "migrants": max(1, migrants),
+        "pop_size": pop_size or max(10, citiesNum * 3 // islands),
+        "children": children or max(10, citiesNum / 2 / islands),
+        "operator": operator,
+        "deadline": deadline,
+        "seeds": [np.asarray(path) for path in seeds or []],
+        "target": target,
+    }
+    seed = random.randrange(2 ** 31) if seed is None else seed
+
+    # One distance matrix for all islands
+    distShm, config["distances"] = _share_distances(dists or Distances(cities))
+    size = islands * config["migrants"] * (citiesNum * 4 + 8) + (islands + 1) * 8
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    try:
+        best, rate = _run_workers(cities, config, shm, seed, checkpoint)
+    finally:
+        shm.unlink()
+        if distShm:
+            distShm.unlink()
+    shm.close()
+    if distShm:
+        distShm.close()
+    return best, rate
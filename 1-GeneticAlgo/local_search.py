@@ -0,0 +1,492 @@
+import time
+from collections import deque
+
+# Candidate neighbors scanned per city
+NEIGHBORS = 8
+# Minimum gain accepted as an improvement, guards against float noise
+EPS = 1e-9
+# Longest segment moved by Or-opt
+OR_SEGMENT = 3
+# Flips chained by one Lin-Kernighan move, and alternatives tried per level
+LK_DEPTH = 6
+LK_BREADTH = (5, 3, 1)
+
+class ArrayTour():
+    ''' Tour stored as an array plus city positions, moves are 2-opt flips '''
+
+    def __init__(self, path):
+        self.tour = [int(city) for city in path]
+        self.n = len(self.tour)
+        self.pos = [0] * self.n
+        for i, city in enumerate(self.tour):
+            self.pos[city] = i
+
+    def succ(self, city):
+        i = self.pos[city] + 1
+        return self.tour[i if i < self.n else 0]
+
+    def pred(self, city):
+        return self.tour[self.pos[city] - 1]
+
+    def between(self, a, b, c):
+        ''' True if b lies on the forward path from a to c '''
+        i = self.pos[a]
+        return (self.pos[b] - i) % self.n <= (self.pos[c] - i) % self.n
+
+    def reverse(self, i, j):
+        ''' Reverse tour positions i..j (cyclic, inclusive), flipping the shorter side '''
+        tour = self.tour
+        pos = self.pos
+        n = self.n
+        inner = (j - i) % n + 1
+        if inner * 2 > n:
+            i, j = (j + 1) % n, (i - 1) % n
+            inner = n - inner
+        for _ in range(inner // 2):
+            a = tour[i]
+            b = tour[j]
+            tour[i] = b
+            pos[b] = i
+            tour[j] = a
+            pos[a] = j
+            i = i + 1 if i + 1 < n else 0
+            j = j - 1 if j > 0 else n - 1
+
+    def move_2opt(self, a, b, c, d):
+        ''' Replace tour edges (a, b) and (c, d) with (a, c) and (b, d) '''
+        if self.succ(a) == b:
+            self.reverse(self.pos[b], self.pos[c])
+        else:
+            self.reverse(self.pos[c], self.pos[b])
+
+    def move_segment(self, a, z, x, y, reverse):
+        '''
+        Move the segment a..z (forward order) between tour neighbors x and y = succ(x).
+
+        :param reverse: True to link x-z and a-y, False to link x-a and z-y.
+        '''
+        p = self.pred(a)
+        s = self.succ(z)
+        if x == s:
+            self.move_2opt(p, a, s, y)
+        elif y == p:
+            self.move_2opt(x, p, z, s)
+        else:
+            self.move_2opt(p, a, x, y)
+            self.move_2opt(p, x, s, z)
+        if not reverse:
+            self.move_2opt(x, z, a, y)
+
+    def to_list(self):
+        return list(self.tour)
+
+class _Segment():
+    ''' Block of a TwoLevelTour: cities in storage order, walked backwards when rev is set '''
+    __slots__ = ("cities", "rev", "rank")
+
+    def __init__(self, cities, rev, rank):
+        self.cities = cities
+        self.rev = rev
+        self.rank = rank
+
+class TwoLevelTour(ArrayTour):
+    '''
+    Two-level list tour: the tour is split into about sqrt(n) segments, each with an orientation bit.
+    succ, pred and between are O(1), reversing a path is O(sqrt(n)): the end segments are split
+    and the segments in between are reordered and have their orientation flipped.
+    '''
+
+    def __init__(self, path, groupSize=None):
+        path = [int(city) for city in path]
+        self.n = len(path)
+        self.groupSize = groupSize or max(8, int(self.n ** 0.5))
+        self.seg = [None] * self.n
+        self.idx = [0] * self.n
+        self._build(path)
+
+    def _build(self, path):
+        ''' (Re)split path into segments of groupSize cities '''
+        size = self.groupSize
+        self.order = []
+        for start in range(0, len(path), size):
+            self.order.append(self._new_segment(path[start:start + size], False, len(self.order)))
+
+    def _new_segment(self, cities, rev, rank):
+        segment = _Segment(cities, rev, rank)
+        seg = self.seg
+        idx = self.idx
+        for i, city in enumerate(cities):
+            seg[city] = segment
+            idx[city] = i
+        return segment
+
+    def _offset(self, city):
+        ''' Position of city within its segment, in tour order '''
+        s = self.seg[city]
+        return len(s.cities) - 1 - self.idx[city] if s.rev else self.idx[city]
+
+    def succ(self, city):
+        s = self.seg[city]
+        i = self.idx[city]
+        if s.rev:
+            if i > 0:
+                return s.cities[i - 1]
+        elif i + 1 < len(s.cities):
+            return s.cities[i + 1]
+        rank = s.rank + 1
+        s = self.order[rank if rank < len(self.order) else 0]
+        return s.cities[-1] if s.rev else s.cities[0]
+
+    def pred(self, city):
+        s = self.seg[city]
+        i = self.idx[city]
+        if s.rev:
+            if i + 1 < len(s.cities):
+                return s.cities[i + 1]
+        elif i > 0:
+            return s.cities[i - 1]
+        s = self.order[s.rank - 1]
+        return s.cities[0] if s.rev else s.cities[-1]
+
+    def between(self, a, b, c):
+        ''' True if b lies on the forward path from a to c '''
+        ka = (self.seg[a].rank, self._offset(a))
+        kb = (self.seg[b].rank, self._offset(b))
+        kc = (self.seg[c].rank, self._offset(c))
+        if ka <= kc:
+            return ka <= kb <= kc
+        return kb >= ka or kb <= kc
+
+    def _split(self, city):
+        ''' Split the segment of city so that city starts a segment in tour order '''
+        s = self.seg[city]
+        offset = self._offset(city)
+        if offset == 0:
+            return
+        cities = s.cities if not s.rev else s.cities[::-1]
+        rank = s.rank
+        self.order[rank] = self._new_segment(cities[:offset], False, rank)
+        self.order.insert(rank + 1, self._new_segment(cities[offset:], False, rank + 1))
+        for r in range(rank + 2, len(self.order)):
+            self.order[r].rank = r
+
+    def reverse_path(self, a, b):
+        ''' Reverse the forward path from a to b (inclusive) '''
+        if a == b:
+            return
+        s = self.seg[a]
+        if s is self.seg[b] and self._offset(a) < self._offset(b):
+            # Inside one segment: reverse the storage slice in place
+            i, j = sorted((self.idx[a], self.idx[b]))
+            cities = s.cities
+            cities[i:j + 1] = cities[i:j + 1][::-1]
+            for k in range(i, j + 1):
+                self.idx[cities[k]] = k
+            return
+        self._split(a)
+        self._split(self.succ(b))
+        order = self.order
+        m = len(order)
+        first = self.seg[a].rank
+        last = self.seg[b].rank
+        count = (last - first) % m + 1
+        if count * 2 > m:
+            # Reversing the complement gives the same cyclic tour for less work
+            first, last = (last + 1) % m, (first - 1) % m
+            count = m - count
+        ranks = [(first + k) % m for k in range(count)]
+        blocks = [order[r] for r in ranks]
+        for r, segment in zip(ranks, reversed(blocks)):
+            segment.rev = not segment.rev
+            segment.rank = r
+            order[r] = segment
+        if m > 2 * (self.n // self.groupSize + 1):
+            # Splits keep adding segments, rebuild once they are twice the target count
+            self._build(self.to_list())
+
+    def move_2opt(self, a, b, c, d):
+        ''' Replace tour edges (a, b) and (c, d) with (a, c) and (b, d) '''
+        if self.succ(a) == b:
+            self.reverse_path(b, c)
+        else:
+            self.reverse_path(c, b)
+
+    def to_list(self):
+        tour = []
+        for s in self.order:
+            tour.extend(s.cities[::-1] if s.rev else s.cities)
+        return tour
+
+# Tours at least this long use TwoLevelTour in the local search
+TWO_LEVEL_CITIES = 1000
+
+# Moves tried and accepted by each operator, [tried, accepted], for profiling
+MOVE_COUNTS = {}
+
+def _improve(path, dists, time_limit, k, step, active=None, name=None):
+    '''
+    Don't-look bit driver shared by every operator.
+
+    :param step: function (tour, city, neigh, d) returning the cities touched by an improving move, or None.
+    :param active: cities whose don't-look bit starts off, every city by default.
+    :param name: key of the operator in MOVE_COUNTS.
+    :return: improved tour as a new list.
+    '''
+    start_time = time.time()
+    if len(path) < 8:
+        return list(path)
+    tour = TwoLevelTour(path) if len(path) >= TWO_LEVEL_CITIES else ArrayTour(path)
+    neigh = dists.candidates(k).tolist()
+    d = dists.dist
+
+    # Cities whose don't-look bit is off
+    if active is None:
+        queue = deque(tour.to_list())
+        queued = [True] * tour.n
+    else:
+        queue = deque()
+        queued = [False] * tour.n
+        for city in active:
+            city = int(city)
+            if not queued[city]:
+                queued[city] = True
+                queue.append(city)
+    checks = 0
+    moves = 0
+    while queue:
+        a = queue.popleft()
+        queued[a] = False
+        touched = step(tour, a, neigh, d)
+        if touched:
+            moves += 1
+            for city in touched:
+                if not queued[city]:
+                    queued[city] = True
+                    queue.append(city)
+        checks += 1
+        if checks % 256 == 0 and time.time() - start_time > time_limit:
+            break
+    counts = MOVE_COUNTS.setdefault(name or step.__name__, [0, 0])
+    counts[0] += checks
+    counts[1] += moves
+    return tour.to_list()
+
+def _two_opt_step(tour, a, neigh, d):
+    ''' First improving 2-opt move removing an edge at a '''
+    for forward in (True, False):
+        b = tour.succ(a) if forward else tour.pred(a)
+        dAB = d(a, b)
+        for c in neigh[a]:
+            dAC = d(a, c)
+            # Neighbors are sorted, no later candidate can give a gain
+            if dAC >= dAB:
+                break
+            e = tour.succ(c) if forward else tour.pred(c)
+            if c == b or e == a:
+                continue
+            if dAC + d(b, e) - dAB - d(c, e) < -EPS:
+                if forward:
+                    tour.move_2opt(a, b, c, e)
+                else:
+                    tour.move_2opt(b, a, e, c)
+                return (a, b, c, e)
+    return None
+
+def _or_opt_step(tour, a, neigh, d):
+    ''' First improving move of a segment of up to OR_SEGMENT cities ending at a next to a neighbor of a '''
+    for length in range(1, OR_SEGMENT + 1):
+        for forward in (True, False):
+            # Segment runs from a away from its insertion point, first/last in forward order
+            z = a
+            for _ in range(length - 1):
+                z = tour.succ(z) if forward else tour.pred(z)
+            first, last = (a, z) if forward else (z, a)
+            p = tour.pred(first)
+            s = tour.succ(last)
+            if p == s or p == last:
+                continue
+            removeGain = d(p, first) + d(last, s) - d(p, s)
+            for c in neigh[a]:
+                if d(a, c) >= removeGain:
+                    break
+                if tour.between(first, c, last):
+                    continue
+                for x, y in ((c, tour.succ(c)), (tour.pred(c), c)):
+                    if tour.between(first, x, last) or tour.between(first, y, last):
+                        continue
+                    # a goes next to c, the other end next to the other endpoint
+                    other = y if x == c else x
+                    addCost = d(a, c) + d(z, other) - d(x, y)
+                    if addCost - removeGain < -EPS:
+                        # reverse=True links x-last and first-y
+                        tour.move_segment(first, last, x, y, (x == c) != (a == first))
+                        return (p, s, first, last, x, y)
+    return None
+
+def _or_2h_step(tour, a, neigh, d):
+    ''' Best of the 2-opt move and the two single-city insertions sharing its removed edges (2h-opt) '''
+    for forward in (True, False):
+        succ = tour.succ if forward else tour.pred
+        pred = tour.pred if forward else tour.succ
+        b = succ(a)
+        dAB = d(a, b)
+        for c in neigh[a]:
+            dAC = d(a, c)
+            if dAC >= dAB:
+                break
+            e = succ(c)
+            if c == b or e == a:
+                continue
+            dCE = d(c, e)
+            bestDelta = dAC + d(b, e) - dAB - dCE
+            bestMove = 0
+            # Move c between a and b
+            pc = pred(c)
+            if pc != b:
+                delta = dAC + d(c, b) - dAB + d(pc, e) - d(pc, c) - dCE
+                if delta < bestDelta:
+                    bestDelta, bestMove = delta, 1
+            # Move b between c and e
+            sb = succ(b)
+            if sb != c:
+                delta = d(c, b) + d(b, e) - dCE + d(a, sb) - dAB - d(b, sb)
+                if delta < bestDelta:
+                    bestDelta, bestMove = delta, 2
+            if bestDelta >= -EPS:
+                continue
+            if bestMove == 0:
+                if forward:
+                    tour.move_2opt(a, b, c, e)
+                else:
+                    tour.move_2opt(b, a, e, c)
+                return (a, b, c, e)
+            if bestMove == 1:
+                x, y = (a, b) if forward else (b, a)
+                tour.move_segment(c, c, x, y, False)
+                return (a, b, c, e, pc)
+            x, y = (c, e) if forward else (e, c)
+            tour.move_segment(b, b, x, y, False)
+            return (a, b, c, e, sb)
+    return None
+
+def _lk_step(tour, t1, neigh, d):
+    ''' Variable-depth chain of 2-opt flips from t1 (Lin-Kernighan style), undone if it does not pay off '''
+    for t2 in (tour.succ(t1), tour.pred(t1)):
+        flips = []
+        if _lk_search(tour, t1, t2, d(t1, t2), neigh, d, flips, {t1, t2}):
+            touched = set()
+            for flip in flips:
+                touched.update(flip)
+            return touched
+    return None
+
+def _lk_search(tour, t1, t2, gain, neigh, d, flips, used):
+    ''' Extend the chain by removing (t1, t2), returns True once the closed tour is shorter '''
+    level = len(flips)
+    forward = tour.succ(t2) == t1
+    candidates = []
+    for t3 in neigh[t2]:
+        g1 = gain - d(t2, t3)
+        if g1 <= EPS:
+            break
+        if t3 in used:
+            continue
+        t4 = tour.succ(t3) if forward else tour.pred(t3)
+        if t4 in used:
+            continue
+        candidates.append((d(t3, t4) - d(t2, t3), t3, t4))
+    candidates.sort(reverse=True)
+    breadth = LK_BREADTH[level] if level < len(LK_BREADTH) else 1
+    for _, t3, t4 in candidates[:breadth]:
+        g1 = gain - d(t2, t3) + d(t3, t4)
+        tour.move_2opt(t2, t1, t3, t4)
+        flips.append((t2, t1, t3, t4))
+        if g1 - d(t4, t1) > EPS:
+            return True
+        if level + 1 < LK_DEPTH:
+            used.update((t3, t4))
+            if _lk_search(tour, t1, t4, g1, neigh, d, flips, used):
+                return True
+            used.difference_update((t3, t4))
+        # Undo: the flip left edges (t2, t3) and (t1, t4)
+        flips.pop()
+        tour.move_2opt(t2, t3, t1, t4)
+    return False
+
+def two_opt(path, dists, time_limit=1, k=NEIGHBORS, active=None):
+    '''
+    2-opt over k nearest neighbor candidates with don't-look bits.
+
+    :param path: tour as a list of city indices.
+    :param dists: Distances backend.
+    :param time_limit: seconds before returning the current tour.
+    :param k: number of candidate neighbors per city.
+    :param active: only start from these cities (e.g. around a change), every city by default.
+    :return: improved tour as a new list.
+    '''
+    return _improve(path, dists, time_limit, k, _two_opt_step, active, "2opt")
+
+def or_opt(path, dists, time_limit=1, k=NEIGHBORS, active=None):
+    ''' Or-opt: move segments of 1..OR_SEGMENT cities next to a candidate neighbor '''
+    return _improve(path, dists, time_limit, k, _or_opt_step, active, "oropt")
+
+def or_2h_opt(path, dists, time_limit=1, k=NEIGHBORS, active=None):
+    ''' 2h-opt / or-2opt: 2-opt combined with single-city insertions '''
+    return _improve(path, dists, time_limit, k, _or_2h_step, active, "or2h")
+
+def lin_kernighan(path, dists, time_limit=1, k=NEIGHBORS, active=None):
+    ''' Lin-Kernighan style variable-depth search built from chained 2-opt flips '''
+    return _improve(path, dists, time_limit, k, _lk_step, active, "lk")
+
+# Local search operators selectable by name
+OPERATORS = {
+    "2opt": two_opt,
+    "oropt": or_opt,
+    "or2h": or_2h_opt,
+    "lk": lin_kernighan,
+}
+
+DEFAULT_PIPELINE = ("2opt", "oropt", "lk")
+
+def run_pipeline(path, dists, stages=DEFAULT_PIPELINE, time_limit=1, k=NEIGHBORS, active=None, target=None):
+    '''
+    Chain local search operators until a full round brings no improvement.
+
+    :param stages: operator names from OPERATORS, run in order.
+    :param active: cities every stage starts from, every city by default.
+    :param target: stop as soon as the tour is at most this long.
+    :return: improved tour and a time-to-quality report with one entry per stage run.
+    '''
+    start_time = time.time()
+    tour = [int(city) for city in path]
+    length = dists.tour_length(tour)
+    report = []
+    improved = True
+    while improved:
+        improved = False
+        for name in stages:
+            remaining = time_limit - (time.time() - start_time)
+            if remaining <= 0:
+                return tour, report
+            stageStart = time.time()
+            newTour = OPERATORS[name](tour, dists, time_limit=remaining, k=k, active=active)
+            newLength = dists.tour_length(newTour)
+            report.append({
+                "operator": name,
+                "seconds": round(time.time() - stageStart, 4),
+                "elapsed": round(time.time() - start_time, 4),
+                "length": round(newLength, 3),
+            })
+            if newLength < length - EPS:
+                tour, length = newTour, newLength
+                improved = True
+            if target is not None and length <= target:
+                return tour, report
+    return tour, report
+
+def format_report(report):
+    ''' One line per stage: operator, stage time, cumulative time and tour length '''
+    return "\n".join(
+        "{:>6} {:9.3f}s {:9.3f}s {:12.3f}".format(r["operator"], r["seconds"], r["elapsed"], r["length"])
+        for r in report
+    )
@@ -0,0 +1,296 @@
+import math, time
+import numpy as np
+
+from construction import greedy_edge_tour, space_filling_tour
+
+# Candidate neighbors per city in the sparse graph the 1-trees are built on
+BOUND_NEIGHBORS = 10
+# Up to this many cities 1-trees are taken over the complete graph
+DENSE_CITIES = 10000
+# Subgradient iterations, and iterations without improvement before the step size is halved
+HK_ITERATIONS = 300
+HK_PATIENCE = 20
+
+def _kruskal(n, edges, weights):
+    '''
+    Minimum spanning forest of a sparse graph.
+
+    :return: boolean mask of the edges in the forest.
+    '''
+    parent = list(range(n))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    inTree = np.zeros(len(edges), dtype=bool)
+    found = 0
+    for e in np.argsort(weights, kind="stable").tolist():
+        a = find(int(edges[e, 0]))
+        b = find(int(edges[e, 1]))
+        if a != b:
+            parent[a] = b
+            inTree[e] = True
+            found += 1
+            if found == n - 1:
+                break
+    return inTree
+
+def _dense_prim(dists, pi):
+    '''
+    Minimum spanning tree of the complete graph under weights d(i, j) + pi[i] + pi[j].
+
+    :return: parent of every city (the root, city 0, is its own parent).
+    '''
+    n = dists.n
+    parent = np.zeros(n, dtype=np.int64)
+    best = dists.row(0) + pi + pi[0]
+    best[0] = np.inf
+    done = np.zeros(n, dtype=bool)
+    done[0] = True
+    for _ in range(n - 1):
+        v = int(np.argmin(best))
+        done[v] = True
+        best[v] = np.inf
+        w = dists.row(v) + pi + pi[v]
+        closer = (w < best) & ~done
+        best[closer] = w[closer]
+        parent[closer] = v
+    return parent
+
+class HeldKarp():
+    '''
+    Held-Karp lower bound: minimum 1-trees under node penalties pi, improved by subgradient optimization.
+
+    Up to DENSE_CITIES cities the 1-trees span the complete graph and the bound is a true lower bound.
+    Larger instances use the candidate graph (k nearest neighbors plus a space-filling-curve path to keep it
+    connected). That is only an estimate (exact is False): it can overshoot when the minimum 1-tree needs
+    edges outside the graph, typically between far apart clusters.
+    '''
+
+    def __init__(self, dists, k=BOUND_NEIGHBORS, dense=None):
+        self.dists = dists
+        self.n = dists.n
+        self.dense = self.n <= DENSE_CITIES if dense is None else dense
+        self.exact = self.dense
+        self.pi = np.zeros(self.n)
+        self.bound = 0.0
+        self.iterations = 0
+        self.parent = None
+        if not self.dense:
+            neigh = dists.neighbors(k)
+            order = np.asarray(space_filling_tour(dists.coords), dtype=np.int64)
+            a = np.concatenate([np.repeat(np.arange(self.n), neigh.shape[1]), order[:-1]])
+            b = np.concatenate([neigh.ravel(), order[1:]])
+            edges = np.unique(np.sort(np.stack([a, b], axis=1), axis=1), axis=0)
+            self.edges = edges[edges[:, 0] != edges[:, 1]]
+            self.lengths = dists.pairs(self.edges[:, 0], self.edges[:, 1])
+
+    def one_tree(self, pi):
+        '''
+        Minimum 1-tree under penalties pi: a minimum spanning tree plus the second cheapest edge of the leaf
+        where that edge is longest.
+
+        :return: 1-tree weight (without the -2 * sum(pi) term), city degrees and the tree as a parent array.
+        '''
+        n = self.n
+        if self.dense:
+            parent = _dense_prim(self.dists, pi)
+            child = np.arange(1, n)
+            treeWeight = float((self.dists.pairs(child, parent[1:]) + pi[child] + pi[parent[1:]]).sum())
+            degree = np.bincount(parent[1:], minlength=n) + 1
+            degree[0] -= 1
+            leaves = np.flatnonzero(degree == 1)
+            # Tree neighbor of every leaf: its parent, or the only child of the root
+            neighbor = parent.copy()
+            neighbor[0] = np.flatnonzero(parent[1:] == 0)[0] + 1
+            second = np.empty(len(leaves))
+            other = np.empty(len(leaves), dtype=np.int64)
+            for i, leaf in enumerate(leaves.tolist()):
+                w = self.dists.row(leaf) + pi + pi[leaf]
+                w[leaf] = np.inf
+                w[neighbor[leaf]] = np.inf
+                other[i] = int(np.argmin(w))
+                second[i] = w[other[i]]
+        else:
+            weights = self.lengths + pi[self.edges[:, 0]] + pi[self.edges[:, 1]]
+            tree = self.edges[_kruskal(n, self.edges, weights)]
+            treeWeight = float((self.dists.pairs(tree[:, 0], tree[:, 1]) + pi[tree[:, 0]] + pi[tree[:, 1]]).sum())
+            degree = np.bincount(tree.ravel(), minlength=n)
+            parent = _parents(n, tree)
+            leaves = np.flatnonzero(degree == 1)
+            neighbor = np.full(n, -1)
+            neighbor[tree[:, 0]] = tree[:, 1]
+            neighbor[tree[:, 1]] = tree[:, 0]
+            # Second cheapest candidate edge of every city, skipping the leaf's tree edge when it ties the cheapest
+            ends = np.concatenate([self.edges[:, 0], self.edges[:, 1]])
+            others = np.concatenate([self.edges[:, 1], self.edges[:, 0]])
+            both = np.concatenate([weights, weights])
+            order = np.lexsort((both, ends))
+            starts = np.searchsorted(ends[order], np.arange(n))
+            counts = np.bincount(ends, minlength=n)
+            pick = np.minimum(starts[leaves] + (others[order][starts[leaves]] == neighbor[leaves]), len(order) - 1)
+            hasSecond = counts[leaves] >= 2
+            second = np.where(hasSecond, both[order][pick], 0.0)
+            other = np.where(hasSecond, others[order][pick], -1)
+        special = int(np.argmax(second))
+        # The special edge adds one to the degree of both its ends
+        degree[leaves[special]] += 1
+        if other[special] >= 0:
+            degree[other[special]] += 1
+        return treeWeight + float(second[special]), degree, parent
+
+    def solve(self, upper=None, time_limit=10, iterations=HK_ITERATIONS):
+        '''
+        Subgradient optimization of the penalties (Held-Karp).
+
+        :param upper: length of a known tour for the step size, a greedy tour is used if not given.
+        :param time_limit: seconds before returning the best bound found so far.
+        :return: lower bound on the optimal tour length.
+        '''
+        start_time = time.time()
+        n = self.n
+        if n < 3:
+            self.bound = self.dists.tour_length(list(range(n)))
+            return self.bound
+        if upper is None:
+            upper = self.dists.tour_length(greedy_edge_tour(self.dists))
+        pi = self.pi.copy()
+        step = 2.0
+        stale = 0
+        for it in range(iterations):
+            weight, degree, parent = self.one_tree(pi)
+            value = weight - 2 * float(pi.sum())
+            self.iterations = it + 1
+            if value > self.bound + 1e-9 or self.parent is None:
+                if value > self.bound:
+                    self.bound = value
+                self.pi = pi.copy()
+                self.parent = parent
+                stale = 0
+            else:
+                stale += 1
+                if stale >= HK_PATIENCE:
+                    step /= 2
+                    stale = 0
+            v = degree - 2
+            norm = float((v * v).sum())
+            # Every city has degree 2: the 1-tree is a tour and the bound is optimal
+            if norm == 0 or step < 1e-6 or time.time() - start_time > time_limit:
+                break
+            pi += step * max(upper - value, 1e-9 * upper) / norm * v
+        return self.bound
+
+    def alpha(self, a, b):
+        '''
+        Alpha-nearness of edges (a[i], b[i]) under the best penalties: how much longer the best 1-tree gets when it
+        is forced to hold the edge, taken as the edge weight minus the longest tree edge on the path between
+        its ends. Tree edges have alpha 0.
+
+        :return: float array.
+        '''
+        a = np.asarray(a, dtype=np.int64).copy()
+        b = np.asarray(b, dtype=np.int64).copy()
+        if self.parent is None:
+            self.solve()
+        pi = self.pi
+        weight = self.dists.pairs(a, b) + pi[a] + pi[b]
+        up, top, depth = self._lifting()
+        result = np.zeros(len(a))
+        swap = depth[a] < depth[b]
+        a[swap], b[swap] = b[swap], a[swap]
+        diff = depth[a] - depth[b]
+        for j in range(len(up)):
+            sel = (diff >> j) & 1 == 1
+            result[sel] = np.maximum(result[sel], top[j][a[sel]])
+            a[sel] = up[j][a[sel]]
+        for j in range(len(up) - 1, -1, -1):
+            sel = up[j][a] != up[j][b]
+            result[sel] = np.maximum(result[sel], np.maximum(top[j][a[sel]], top[j][b[sel]]))
+            a[sel] = up[j][a[sel]]
+            b[sel] = up[j][b[sel]]
+        sel = a != b
+        result[sel] = np.maximum(result[sel], np.maximum(top[0][a[sel]], top[0][b[sel]]))
+        return np.maximum(weight - result, 0.0)
+
+    def _lifting(self):
+        ''' Binary lifting tables of the best tree: 2^j-th ancestors, largest edge weight up to them, depths '''
+        n = self.n
+        parent = self.parent
+        pi = self.pi
+        cities = np.arange(n)
+        top0 = self.dists.pairs(cities, parent) + pi + pi[parent]
+        top0[parent == cities] = 0.0
+        depth = _depths(parent)
+        up = [parent]
+        top = [top0]
+        for _ in range(max(1, math.ceil(math.log2(max(2, depth.max() + 1))))):
+            prev = up[-1]
+            up.append(prev[prev])
+            top.append(np.maximum(top[-1], top[-1][prev]))
+        return up, top, depth
+
+    def candidates(self, k, pool=None):
+        '''
+        Alpha-nearness candidate lists: the k cities with the smallest alpha among the pool nearest of each city,
+        ties broken by distance, listed closest first.
+
+        :param pool: nearest neighbors considered per city, 3 * k by default.
+        :return: (n, k) integer array.
+        '''
+        pool = min(self.n - 1, pool or 3 * k)
+        k = min(k, pool)
+        neigh = self.dists.neighbors(pool)
+        cities = np.repeat(np.arange(self.n), pool)
+        alpha = self.alpha(cities, neigh.ravel()).reshape(self.n, pool)
+        # Neighbors are sorted by distance, a stable sort on alpha keeps that order among ties
+        order = np.argsort(alpha, axis=1, kind="stable")[:, :k]
+        # Local search stops scanning a list at the first candidate too far away, so the chosen ones go closest first
+        return np.take_along_axis(neigh, np.sort(order, axis=1), axis=1)
+
+def _parents(n, tree):
+    ''' Parent array of a spanning forest given as an edge list, each component rooted at its smallest city '''
+    adjacency = [[] for _ in range(n)]
+    for a, b in tree.tolist():
+        adjacency[a].append(b)
+        adjacency[b].append(a)
+    parent = np.arange(n)
+    seen = [False] * n
+    for root in range(n):
+        if seen[root]:
+            continue
+        seen[root] = True
+        stack = [root]
+        while stack:
+            v = stack.pop()
+            for u in adjacency[v]:
+                if not seen[u]:
+                    seen[u] = True
+                    parent[u] = v
+                    stack.append(u)
+    return parent
+
+def _depths(parent):
+    ''' Depth of every city in a parent-array forest '''
+    n = len(parent)
+    depth = np.full(n, -1, dtype=np.int64)
+    roots = parent == np.arange(n)
+    depth[roots] = 0
+    parentList = parent.tolist()
+    depthList = depth.tolist()
+    for v in range(n):
+        path = []
+        while depthList[v] < 0:
+            path.append(v)
+            v = parentList[v]
+        d = depthList[v]
+        for u in reversed(path):
+            d += 1
+            depthList[u] = d
+    return np.array(depthList, dtype=np.int64)
+
+def held_karp_bound(dists, upper=None, time_limit=10, k=BOUND_NEIGHBORS):
+    ''' Held-Karp lower bound on the optimal tour length '''
+    return HeldKarp(dists, k).solve(upper, time_limit)
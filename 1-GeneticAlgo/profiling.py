@@ -0,0 +1,88 @@
+import cProfile, json, time
+from contextlib import contextmanager, nullcontext
+
+import local_search
+
+class Profiler():
+    ''' Opt-in instrumentation: phase timers, counters and a JSON-lines trace '''
+
+    def __init__(self, trace=None, profile=None):
+        '''
+        :param trace: JSON-lines file receiving one record per event, None to keep the totals only.
+        :param profile: file for a cProfile dump of the whole run, None to skip it.
+        '''
+        self.start = time.time()
+        self.timers = {}
+        self.counters = {}
+        self.traceFile = open(trace, "w") if trace else None
+        self.profileName = profile
+        self.profile = None
+        # Local search counters are global, only the difference over this run is reported
+        self.moveBase = {name: list(counts) for name, counts in local_search.MOVE_COUNTS.items()}
+        if profile:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def event(self, kind, **fields):
+        ''' Write one trace record '''
+        if self.traceFile:
+            record = {"event": kind, "t": round(time.time() - self.start, 4)}
+            record.update(fields)
+            self.traceFile.write(json.dumps(record) + "\n")
+
+    @contextmanager
+    def timer(self, phase):
+        ''' Add the time spent in the block to phase '''
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            self.timers[phase] = self.timers.get(phase, 0.0) + time.time() - start_time
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def generation(self, index, lengths):
+        ''' Record best and mean tour length of a generation '''
+        self.event("generation", generation=index, best=round(float(min(lengths)), 3),
+                   mean=round(float(sum(lengths) / len(lengths)), 3), size=len(lengths))
+
+    def move_counts(self):
+        ''' Local search moves tried and accepted per operator during this run '''
+        counts = {}
+        for name, (tried, accepted) in local_search.MOVE_COUNTS.items():
+            baseTried, baseAccepted = self.moveBase.get(name, (0, 0))
+            counts[name] = {"tried": tried - baseTried, "accepted": accepted - baseAccepted}
+        return counts
+
+    def summary(self, **extra):
+        summary = {
+            "seconds": round(time.time() - self.start, 4),
+            "phases": {phase: round(seconds, 4) for phase, seconds in self.timers.items()},
+            "counters": dict(self.counters),
+            "moves": self.move_counts(),
+        }
+        summary.update(extra)
+        return summary
+
+    def close(self, **extra):
+        '''
+        Write the summary record, close the trace and dump the profile.
+
+        :param extra: more summary fields, e.g. cache statistics.
+        :return: the summary dict.
+        '''
+        summary = self.summary(**extra)
+        self.event("summary", **summary)
+        if self.traceFile:
+            self.traceFile.close()
+            self.traceFile = None
+        if self.profile:
+            self.profile.disable()
+            self.profile.dump_stats(self.profileName)
+            self.profile = None
+        return summary
+
+def timer(profiler, phase):
+    ''' profiler.timer(phase), or a no-op context when profiling is off '''
+    return profiler.timer(phase) if profiler else nullcontext()
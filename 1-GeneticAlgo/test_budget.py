@@ -0,0 +1,17 @@
+import os, stat
+
+import numpy as np
+
+from budget import Checkpoint
+from distance import Distances
+
+def test_checkpoint_file_mode(tmp_path):
+    ''' The output file gets the permissions of a file made with open(), not mkstemp's owner-only ones '''
+    cities = np.random.default_rng(0).integers(0, 100, size=(5, 3))
+    filename = str(tmp_path / "output.txt")
+    umask = os.umask(0o022)
+    try:
+        Checkpoint(cities, Distances(cities), filename).offer([0, 1, 2, 3, 4])
+    finally:
+        os.umask(umask)
+    assert stat.S_IMODE(os.stat(filename).st_mode) == 0o644
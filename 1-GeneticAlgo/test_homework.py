@@ -0,0 +1,30 @@
+import numpy as np
+
+import homework
+
+def test_select_parents_draws_distinct_members(monkeypatch):
+    ''' Tournament members are drawn without replacement, so the worst individual can never win '''
+    monkeypatch.setattr(homework, "rng", np.random.default_rng(0))
+    fitnessScores = np.array([5.0, 1.0, 3.0])
+    winners = homework.select_parents(fitnessScores, None, size=3, pairs=200)
+    assert winners.shape == (200, 2)
+    assert (winners == 1).all()
+
+    fitnessScores = np.arange(10, dtype=float)
+    winners = homework.select_parents(fitnessScores, None, size=3, pairs=2000)
+    assert winners.max() <= 7
+
+def test_select_best_polishes_everyone_without_budget(monkeypatch):
+    ''' With no budget every individual gets its 2-opt pass before the best one is polished '''
+    calls = []
+    def two_opt(path, dists, time_limit=10):
+        calls.append(time_limit)
+        return path
+    monkeypatch.setattr(homework, "two_opt", two_opt)
+    monkeypatch.setattr(homework, "run_pipeline", lambda path, dists, time_limit, target: (list(path), []))
+    monkeypatch.setattr(homework, "format_report", lambda report: "")
+    rng = np.random.default_rng(0)
+    cities = rng.integers(0, 100, size=(12, 3))
+    population = np.array([rng.permutation(12) for _ in range(20)])
+    homework.select_best(population, homework.Distances(cities), homework.Deadline(None))
+    assert len(calls) == 20
@@ -0,0 +1,29 @@
+from itertools import permutations
+
+import numpy as np
+
+from distance import Distances
+from lower_bound import HeldKarp
+
+def _instance(n, seed=0):
+    return Distances(np.random.default_rng(seed).integers(0, 100, size=(n, 3)))
+
+def test_one_tree_degrees_sum_to_two_n():
+    ''' The special edge counts at both of its ends '''
+    dists = _instance(30)
+    for dense in (True, False):
+        _, degree, _ = HeldKarp(dists, k=8, dense=dense).one_tree(np.zeros(dists.n))
+        assert degree.sum() == 2 * dists.n
+
+def test_bound_below_optimum():
+    for seed in range(5):
+        dists = _instance(8, seed)
+        optimum = min(dists.tour_length([0] + list(p)) for p in permutations(range(1, 8)))
+        assert HeldKarp(dists).solve(time_limit=5) <= optimum + 1e-6
+
+def test_alpha_candidates_closest_first():
+    ''' Local search stops scanning a candidate list at the first city too far away '''
+    dists = _instance(60)
+    candidates = HeldKarp(dists).candidates(5)
+    lengths = dists.pairs(np.repeat(np.arange(dists.n), 5), candidates.ravel()).reshape(dists.n, 5)
+    assert (np.diff(lengths, axis=1) >= 0).all()
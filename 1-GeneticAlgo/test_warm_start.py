@@ -0,0 +1,25 @@
+import numpy as np
+
+from warm_start import map_tour
+
+def _instance(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 1000, size=(n, 3))
+
+def test_map_tour_with_added_cities():
+    ''' Old cities keep their tour order, the new ones are reported as added '''
+    cities = _instance(50)
+    tour = np.random.default_rng(1).permutation(45)
+    kept, added, _ = map_tour(cities[tour], cities)
+    assert kept.tolist() == tour.tolist()
+    assert added.tolist() == list(range(45, 50))
+
+def test_map_tour_with_removed_cities():
+    ''' Removed cities are dropped from the tour and nothing is added '''
+    oldCities = _instance(50)
+    tour = np.random.default_rng(1).permutation(50)
+    cities = oldCities[:47]
+    kept, added, splice = map_tour(oldCities[tour], cities)
+    assert kept.tolist() == [city for city in tour.tolist() if city < 47]
+    assert len(added) == 0
+    assert len(splice) > 0
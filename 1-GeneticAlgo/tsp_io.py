@@ -0,0 +1,85 @@
+import os, sys
+import numpy as np
+
+# Cities written per chunk by the streaming writer
+WRITE_CHUNK = 1 << 16
+
+def sidecar_path(filename):
+    ''' Binary sidecar stored next to a text instance, input.txt -> input.npy '''
+    return os.path.splitext(filename)[0] + ".npy"
+
+def parse_cities(text):
+    '''
+    Bulk-parse the text format: city count on the first line, then one "x y z" line per city.
+
+    :return: (n, 3) integer array (float if the coordinates are not integral).
+    '''
+    values = np.fromstring(text, dtype=np.float64, sep=" ")
+    if len(values) == 0:
+        return np.empty((0, 3), dtype=np.int64)
+    citiesNum = int(values[0])
+    coords = values[1:1 + 3 * citiesNum]
+    if len(coords) != 3 * citiesNum:
+        raise ValueError("Expected {} cities, found {} coordinates".format(citiesNum, len(coords)))
+    coords = coords.reshape(citiesNum, 3)
+    if np.all(coords == np.round(coords)):
+        return coords.astype(np.int64)
+    return coords
+
+def load_cities(filename="input.txt", use_sidecar=True):
+    '''
+    Load an instance, memory-mapping the binary sidecar when it is at least as new as the text file.
+
+    :return: (n, 3) array of coordinates.
+    '''
+    sidecar = sidecar_path(filename)
+    if use_sidecar and os.path.exists(sidecar):
+        if not os.path.exists(filename) or os.path.getmtime(sidecar) >= os.path.getmtime(filename):
+            return np.load(sidecar, mmap_mode="r")
+    with open(filename, "r") as f:
+        return parse_cities(f.read())
+
+def write_sidecar(cities, filename="input.txt"):
+    ''' Save coordinates in the compact binary sidecar format (a .npy file, int32 when the values fit) '''
+    cities = np.asarray(cities)
+    if cities.dtype.kind == "i" and (len(cities) == 0 or np.abs(cities).max() < 2 ** 31):
+        cities = cities.astype(np.int32)
+    path = sidecar_path(filename)
+    np.save(path, cities)
+    return path
+
+def write_tour(cities, path, dist, filename="output.txt"):
+    ''' Stream the tour length and the visited coordinates to filename chunk by chunk '''
+    cities = np.asarray(cities)
+    path = np.asarray(path)
+    value = "%d" if cities.dtype.kind in "iu" else "%r"
+    line = " ".join([value] * cities.shape[1]) + "\n"
+    with open(filename, "w") as f:
+        f.write(str(dist) + "\n")
+        # One formatting pass per chunk keeps memory bounded regardless of the tour size
+        for start in range(0, len(path), WRITE_CHUNK):
+            chunk = cities[path[start:start + WRITE_CHUNK]]
+            f.write((line * len(chunk)) % tuple(chunk.ravel().tolist()))
+
+def read_tour(filename="output.txt"):
+    '''
+    Read a tour written by write_tour.
+
+    :return: tour length and (m, 3) array of the visited coordinates, without the repeated start city.
+    '''
+    with open(filename, "r") as f:
+        values = np.fromstring(f.read(), dtype=np.float64, sep=" ")
+    if len(values) == 0:
+        raise ValueError("Empty tour file: " + filename)
+    coords = values[1:]
+    if len(coords) % 3:
+        raise ValueError("Tour coordinates are not x y z triples: " + filename)
+    coords = coords.reshape(-1, 3)
+    if len(coords) > 1 and np.array_equal(coords[0], coords[-1]):
+        coords = coords[:-1]
+    return float(values[0]), coords
+
+if __name__ == "__main__":
+    # Convert text instances to binary sidecars: python tsp_io.py input.txt [...]
+    for name in sys.argv[1:] or ["input.txt"]:
+        print(write_sidecar(load_cities(name, use_sidecar=False), name))
@@ -0,0 +1,138 @@
+import numpy as np
+
+from local_search import NEIGHBORS, run_pipeline
+from tsp_io import read_tour
+
+def _occurrence_keys(ids, scale):
+    '''
+    Key per entry that tells apart repeated ids: id and how many times it was seen before.
+
+    :param scale: above any rank, the same for every array whose keys are compared.
+    '''
+    order = np.argsort(ids, kind="stable")
+    sortedIds = ids[order]
+    starts = np.searchsorted(sortedIds, sortedIds)
+    rank = np.empty(len(ids), dtype=np.int64)
+    rank[order] = np.arange(len(ids)) - starts
+    return ids * scale + rank
+
+def map_tour(tourCoords, cities):
+    '''
+    Match the coordinates of an old tour to the cities of the current instance.
+    Cities sharing coordinates are matched one to one.
+
+    :return: matched city indexes in old tour order (removed cities dropped), indexes of new cities,
+        and the matched cities next to where removed ones were spliced out.
+    '''
+    tourCoords = np.asarray(tourCoords, dtype=np.float64)
+    cities = np.asarray(cities, dtype=np.float64)
+    _, ids = np.unique(np.concatenate([tourCoords, cities]), axis=0, return_inverse=True)
+    ids = ids.reshape(-1)
+    scale = max(len(tourCoords), len(cities)) + 1
+    oldKeys = _occurrence_keys(ids[:len(tourCoords)], scale)
+    newKeys = _occurrence_keys(ids[len(tourCoords):], scale)
+    _, oldPos, newIdx = np.intersect1d(oldKeys, newKeys, assume_unique=True, return_indices=True)
+    kept = newIdx[np.argsort(oldPos)]
+    added = np.setdiff1d(np.arange(len(cities)), kept)
+    # Cities next to a gap left by removed ones
+    matched = np.zeros(len(tourCoords), dtype=bool)
+    matched[oldPos] = True
+    return kept, added, _splice_points(matched, kept)
+
+def _splice_points(matched, kept):
+    ''' Kept cities on either side of every run of removed cities '''
+    if len(kept) == 0 or matched.all():
+        return np.empty(0, dtype=np.int64)
+    keptPos = np.cumsum(matched) - 1
+    gaps = np.flatnonzero(~matched)
+    after = keptPos[gaps] + 1
+    return np.unique(kept[np.concatenate([after % len(kept), (after - 1) % len(kept)])])
+
+def cheapest_insertion(tour, added, dists, k=NEIGHBORS):
+    '''
+    Insert cities one by one where they lengthen the tour least,
+    trying the edges next to their k nearest neighbors already in the tour.
+
+    :return: new tour list.
+    '''
+    n = dists.n
+    nxt = [-1] * n
+    prv = [-1] * n
+    inTour = np.zeros(n, dtype=bool)
+    tour = [int(city) for city in tour]
+    for a, b in zip(tour, tour[1:] + tour[:1]):
+        nxt[a] = b
+        prv[b] = a
+    inTour[tour] = True
+    neigh = dists.neighbors(k).tolist()
+    d = dists.dist
+    for c in added:
+        c = int(c)
+        candidates = [u for u in neigh[c] if inTour[u]]
+        if not candidates:
+            # No near neighbor placed yet: use the closest tour city overall
+            row = dists.row(c)
+            row[~inTour] = np.inf
+            candidates = [int(np.argmin(row))]
+        best = None
+        for u in candidates:
+            for a, b in ((u, nxt[u]), (prv[u], u)):
+                cost = d(a, c) + d(c, b) - d(a, b)
+                if best is None or cost < best[0]:
+                    best = (cost, a, b)
+        _, a, b = best
+        nxt[a] = c
+        prv[c] = a
+        nxt[c] = b
+        prv[b] = c
+        inTour[c] = True
+    start = tour[0]
+    result = [start]
+    city = nxt[start]
+    while city != start:
+        result.append(city)
+        city = nxt[city]
+    return result
+
+def repair_tour(tourCoords, cities, dists, k=NEIGHBORS):
+    '''
+    Turn an old tour into a tour of the current instance: splice out removed cities, insert new ones.
+
+    :return: tour list and the affected cities (splice points, inserted cities and their tour neighbors),
+        or None if no city of the old tour is left.
+    '''
+    kept, added, affected = map_tour(tourCoords, cities)
+    if len(kept) == 0:
+        return None
+    tour = cheapest_insertion(kept, added, dists, k) if len(added) else kept.tolist()
+    affected = set(affected.tolist())
+    if len(added):
+        pos = np.empty(dists.n, dtype=np.int64)
+        pos[tour] = np.arange(len(tour))
+        near = (pos[added][:, None] + np.arange(-1, 2)[None, :]) % len(tour)
+        affected.update(np.asarray(tour)[near.ravel()].tolist())
+    return tour, sorted(affected)
+
+def warm_start(filename, cities, dists, time_limit=10, k=NEIGHBORS):
+    '''
+    Load a previous tour, repair it for the current instance and re-optimize around the changes.
+
+    :param filename: tour file written by a previous run.
+    :param time_limit: seconds for the local search.
+    :return: tour list and a summary dict, or None if the old tour shares no city with the instance.
+    '''
+    _, tourCoords = read_tour(filename)
+    repaired = repair_tour(tourCoords, cities, dists, k)
+    if repaired is None:
+        return None
+    tour, affected = repaired
+    info = {
+        "previous": len(tourCoords),
+        "cities": dists.n,
+        "affected": len(affected),
+        "repaired_length": round(dists.tour_length(tour), 3),
+    }
+    if affected:
+        tour, _ = run_pipeline(tour, dists, time_limit=time_limit, k=k, active=affected)
+    info["length"] = round(dists.tour_length(tour), 3)
+    return tour, info
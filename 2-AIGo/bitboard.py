@@ -0,0 +1,495 @@
+import copy
+from functools import lru_cache
+
+from host import GO, zobrist_table
+
+@lru_cache(maxsize=None)
+def board_masks(n):
+    '''
+    Precomputed masks of an n*n board, point (i, j) being bit i * n + j.
+
+    :param n: width and height of the board.
+    :return: full-board mask, mask without the first column, mask without the last column
+        and a tuple with the neighbor mask of every point.
+    '''
+    full = (1 << n * n) - 1
+    not_first = full
+    not_last = full
+    for i in range(n):
+        not_first &= ~(1 << i * n)
+        not_last &= ~(1 << i * n + n - 1)
+    masks = (full, not_first, not_last)
+    neighbors = tuple(spread(1 << p, n, masks) for p in range(n * n))
+    return full, not_first, not_last, neighbors
+
+def spread(bits, n, masks):
+    '''
+    Points next to any point of bits, by shifting one row up and down and one column left and right.
+
+    :param masks: the first three entries of board_masks(n).
+    :return: mask of the neighbors (it may include points of bits).
+    '''
+    full, not_first, not_last = masks[:3]
+    return ((bits >> n) | (bits << n) | ((bits & not_first) >> 1) | ((bits & not_last) << 1)) & full
+
+def flood(seed, within, n, masks):
+    '''
+    Grow seed inside within until it stops changing: the group (chain) of the seed stones.
+
+    :return: mask of the group.
+    '''
+    group = seed
+    while True:
+        grown = (group | spread(group, n, masks)) & within
+        if grown == group:
+            return group
+        group = grown
+
+def popcount(bits):
+    ''' Number of set bits '''
+    return bin(bits).count("1")
+
+def bits_to_positions(bits, n):
+    ''' (row, column) of every set bit, in row-major order '''
+    positions = []
+    while bits:
+        low = bits & -bits
+        p = low.bit_length() - 1
+        positions.append((p // n, p % n))
+        bits ^= low
+    return positions
+
+def bits_to_board(black, white, n):
+    ''' List-of-lists board with 0 for empty, 1 for black and 2 for white '''
+    return [[1 if black >> (i * n + j) & 1 else 2 if white >> (i * n + j) & 1 else 0 for j in range(n)] for i in range(n)]
+
+def board_to_bits(board):
+    ''' Black and white bitboards of a list-of-lists board '''
+    n = len(board)
+    black = 0
+    white = 0
+    for i in range(n):
+        for j in range(n):
+            if board[i][j] == 1:
+                black |= 1 << (i * n + j)
+            elif board[i][j] == 2:
+                white |= 1 << (i * n + j)
+    return black, white
+
+def bits_hash(bits, keys):
+    ''' XOR of the Zobrist keys of the set bits '''
+    value = 0
+    while bits:
+        low = bits & -bits
+        value ^= keys[low.bit_length() - 1]
+        bits ^= low
+    return value
+
+class BitGO(GO):
+    '''
+    Go game on bitboards: black and white stones are kept as two integers, groups and liberties
+    are found by shift-and-mask flood fills. Same rules and interface as GO.
+
+    board and previous_board are list-of-lists views built on demand; change them by assigning a new board,
+    not by writing into the returned lists.
+    '''
+
+    def __init__(self, n):
+        '''
+        Go game.
+
+        :param n: size of the board n*n
+        '''
+        super().__init__(n)
+        self.masks = board_masks(n)
+        self.keys = zobrist_table(n)
+        self.black = 0
+        self.white = 0
+        self.hash = 0
+        self.previous_black = 0
+        self.previous_white = 0
+        self._board = None
+        self._previous_board = None
+
+    @property
+    def board(self):
+        if self._board is None:
+            self._board = bits_to_board(self.black, self.white, self.size)
+        return self._board
+
+    @board.setter
+    def board(self, board):
+        self.set_stones(*board_to_bits(board))
+
+    @property
+    def previous_board(self):
+        if self._previous_board is None:
+            self._previous_board = bits_to_board(self.previous_black, self.previous_white, self.size)
+        return self._previous_board
+
+    @previous_board.setter
+    def previous_board(self, board):
+        self.previous_black, self.previous_white = board_to_bits(board)
+        self._previous_board = None
+
+    def stones(self, piece_type):
+        '''
+        Bitboard of one color.
+
+        :param piece_type: 1('X') or 2('O').
+        :return: integer mask of the stones.
+        '''
+        return self.black if piece_type == 1 else self.white
+
+    def empty(self):
+        ''' Bitboard of the empty points '''
+        return self.masks[0] & ~(self.black | self.white)
+
+    def set_stones(self, black, white):
+        '''
+        Replace the current position, updating the Zobrist hash with the stones that changed.
+
+        :param black: bitboard of the black stones.
+        :param white: bitboard of the white stones.
+        :return: None.
+        '''
+        self.hash ^= bits_hash(self.black ^ black, self.keys[0]) ^ bits_hash(self.white ^ white, self.keys[1])
+        self.black = black
+        self.white = white
+        self._board = None
+
+    def init_board(self, n):
+        '''
+        Initialize a board with size n*n.
+
+        :param n: width and height of the board.
+        :return: None.
+        '''
+        self.size = n
+        self.masks = board_masks(n)
+        self.keys = zobrist_table(n)
+        self.black = 0
+        self.white = 0
+        self.hash = 0
+        self._board = None
+        self.previous_black = 0
+        self.previous_white = 0
+        self._previous_board = None
+
+    def copy_board(self):
+        '''
+        Copy the current board for potential testing.
+
+        :param: None.
+        :return: the copied board instance.
+        '''
+        new_go = copy.copy(self)
+        new_go.died_pieces = list(self.died_pieces)
+        new_go.undo_stack = list(self.undo_stack)
+        new_go._board = None
+        new_go._previous_board = None
+        return new_go
+
+    def group(self, i, j):
+        '''
+        Bitboard of the group a point belongs to: connected points of the same color, or connected empty points.
+
+        :param i: row number of the board.
+        :param j: column number of the board.
+        :return: mask of the group.
+        '''
+        bit = 1 << (i * self.size + j)
+        own = self.black if self.black & bit else self.white if self.white & bit else self.empty()
+        return flood(bit, own, self.size, self.masks)
+
+    def liberties(self, group):
+        ''' Bitboard of the empty points next to a group '''
+        return spread(group, self.size, self.masks) & self.empty()
+
+    def ally_dfs(self, i, j):
+        '''
+        Search for all allies of a given stone.
+
+        :param i: row number of the board.
+        :param j: column number of the board.
+        :return: a list containing the all allies row and column (row, column) of position (i, j).
+        '''
+        return bits_to_positions(self.group(i, j), self.size)
+
+    def find_liberty(self, i, j):
+        '''
+        Find liberty of a given stone. If a group of allied stones has no liberty, they all die.
+
+        :param i: row number of the board.
+        :param j: column number of the board.
+        :return: boolean indicating whether the given stone still has liberty.
+        '''
+        return self.liberties(self.group(i, j)) != 0
+
+    def dead_stones(self, piece_type):
+        '''
+        Bitboard of the stones of a color whose group has no liberty.
+
+        :param piece_type: 1('X') or 2('O').
+        :return: mask of the dead stones.
+        '''
+        n = self.size
+        masks = self.masks
+        stones = self.stones(piece_type)
+        empty = self.empty()
+        dead = 0
+        remaining = stones
+        while remaining:
+            group = flood(remaining & -remaining, stones, n, masks)
+            if not spread(group, n, masks) & empty:
+                dead |= group
+            remaining &= ~group
+        return dead
+
+    def find_died_pieces(self, piece_type):
+        '''
+        Find the died stones that has no liberty in the board for a given piece type.
+
+        :param piece_type: 1('X') or 2('O').
+        :return: a list containing the dead pieces row and column(row, column).
+        '''
+        return bits_to_positions(self.dead_stones(piece_type), self.size)
+
+    def remove_died_pieces(self, piece_type):
+        '''
+        Remove the dead stones in the board.
+
+        :param piece_type: 1('X') or 2('O').
+        :return: locations of dead pieces.
+        '''
+        dead = self.dead_stones(piece_type)
+        if not dead:
+            return []
+        self.set_stones(self.black & ~dead, self.white & ~dead)
+        return bits_to_positions(dead, self.size)
+
+    def remove_certain_pieces(self, positions):
+        '''
+        Remove the stones of certain locations.
+
+        :param positions: a list containing the pieces to be removed row and column(row, column)
+        :return: None.
+        '''
+        mask = 0
+        for piece in positions:
+            mask |= 1 << (piece[0] * self.size + piece[1])
+        self.set_stones(self.black & ~mask, self.white & ~mask)
+
+    def place_chess(self, i, j, piece_type):
+        '''
+        Place a chess stone in the board.
+
+        :param i: row number of the board.
+        :param j: column number of the board.
+        :param piece_type: 1('X') or 2('O').
+        :return: boolean indicating whether the placement is valid.
+        '''
+        if not self.valid_place_check(i, j, piece_type):
+            return False
+        self.previous_black = self.black
+        self.previous_white = self.white
+        self._previous_board = None
+        bit = 1 << (i * self.size + j)
+        if piece_type == 1:
+            self.set_stones(self.black | bit, self.white)
+        else:
+            self.set_stones(self.black, self.white | bit)
+        return True
+
+    def make_move(self, i, j, piece_type):
+        '''
+        Play a stone in place: place it, remove the captured opponent stones and update the KO state,
+        pushing the previous position on the undo stack.
+
+        :param i: row number of the board.
+        :param j: column number of the board.
+        :param piece_type: 1('X') or 2('O').
+        :return: boolean indicating whether the move was valid (nothing changes if not).
+        '''
+        if not self.valid_place_check(i, j, piece_type, test_check=True):
+            return False
+        self.undo_stack.append((self.black, self.white, self.previous_black, self.previous_white, self.died_pieces))
+        self.previous_black = self.black
+        self.previous_white = self.white
+        self._previous_board = None
+        bit = 1 << (i * self.size + j)
+        black = self.black | bit if piece_type == 1 else self.black
+        white = self.white | bit if piece_type == 2 else self.white
+        self.set_stones(black, white)
+        dead = self.dead_stones(3 - piece_type)
+        if dead:
+            self.set_stones(black & ~dead, white & ~dead)
+        self.died_pieces = bits_to_positions(dead, self.size)
+        return True
+
+    def make_pass(self):
+        '''
+        Pass in place: the previous board becomes the current one.
+
+        :return: None.
+        '''
+        self.undo_stack.append((self.black, self.white, self.previous_black, self.previous_white, self.died_pieces))
+        self.previous_black = self.black
+        self.previous_white = self.white
+        self._previous_board = None
+
+    def undo_move(self):
+        '''
+        Take back the last make_move or make_pass.
+
+        :return: None.
+        '''
+        black, white, self.previous_black, self.previous_white, self.died_pieces = self.undo_stack.pop()
+        self.set_stones(black, white)
+        self._previous_board = None
+
+    def legal_moves(self, piece_type):
+        '''
+        All valid placements at once: empty points next to an empty point or to an allied group with another
+        liberty, plus the last liberties of opponent groups unless taking them repeats the previous board (KO).
+        Same result as valid_place_check on every point.
+
+        :param piece_type: 1('X') or 2('O').
+        :return: bit mask of the valid points, bit i * n + j for (i, j).
+        '''
+        n = self.size
+        masks = self.masks
+        empty = self.empty()
+        own = self.stones(piece_type)
+        other = self.stones(3 - piece_type)
+        legal = spread(empty, n, masks) & empty
+        remaining = own
+        while remaining:
+            group = flood(remaining & -remaining, own, n, masks)
+            liberties = spread(group, n, masks) & empty
+            if liberties & (liberties - 1):
+                legal |= liberties
+            remaining &= ~group
+        capturing = 0
+        dead = False
+        remaining = other
+        while remaining:
+            group = flood(remaining & -remaining, other, n, masks)
+            liberties = spread(group, n, masks) & empty
+            if not liberties:
+                dead = True
+            elif not liberties & (liberties - 1):
+                capturing |= liberties
+            remaining &= ~group
+        capturing &= ~legal
+        # Captures can only be undone by KO, or come from groups already without liberty
+        check = (empty & ~legal) if dead else capturing if self.died_pieces else 0
+        legal |= capturing & ~check
+        while check:
+            low = check & -check
+            p = low.bit_length() - 1
+            if self.valid_place_check(p // n, p % n, piece_type, test_check=True):
+                legal |= low
+            check ^= low
+        return legal
+
+    def valid_place_check(self, i, j, piece_type, test_check=False):
+        '''
+        Check whether a placement is valid.
+
+        :param i: row number of the board.
+        :param j: column number of the board.
+        :param piece_type: 1(white piece) or 2(black piece).
+        :param test_check: boolean if it's a test check.
+        :return: boolean indicating whether the placement is valid.
+        '''
+        n = self.size
+        verbose = self.verbose and not test_check
+
+        # Check if the place is in the board range
+        if not (i >= 0 and i < n):
+            if verbose:
+                print(('Invalid placement. row should be in the range 1 to {}.').format(n - 1))
+            return False
+        if not (j >= 0 and j < n):
+            if verbose:
+                print(('Invalid placement. column should be in the range 1 to {}.').format(n - 1))
+            return False
+
+        # Check if the place already has a piece
+        bit = 1 << (i * n + j)
+        if (self.black | self.white) & bit:
+            if verbose:
+                print('Invalid placement. There is already a chess in this position.')
+            return False
+
+        # Check if the place has liberty
+        masks = self.masks
+        own = self.stones(piece_type) | bit
+        other = self.stones(3 - piece_type)
+        empty = masks[0] & ~(own | other)
+        group = flood(bit, own, n, masks)
+        if spread(group, n, masks) & empty:
+            return True
+
+        # If not, remove the died pieces of opponent and check again
+        dead = 0
+        remaining = other
+        while remaining:
+            other_group = flood(remaining & -remaining, other, n, masks)
+            if not spread(other_group, n, masks) & empty:
+                dead |= other_group
+            remaining &= ~other_group
+        if not spread(group, n, masks) & (empty | dead):
+            if verbose:
+                print('Invalid placement. No liberty found in this position.')
+            return False
+
+        # Check special case: repeat placement causing the repeat board state (KO rule)
+        if self.died_pieces:
+            other &= ~dead
+            black, white = (own, other) if piece_type == 1 else (other, own)
+            if black == self.previous_black and white == self.previous_white:
+                if verbose:
+                    print('Invalid placement. A repeat move not permitted by the KO rule.')
+                return False
+        return True
+
+    def zobrist_hash(self):
+        '''
+        Zobrist hash of the current board.
+
+        :return: 64-bit integer.
+        '''
+        return self.hash
+
+    def ko_key(self):
+        '''
+        Hash of the KO state: the previous board matters only when the last move captured stones.
+
+        :return: 64-bit integer, 0 when KO cannot apply.
+        '''
+        if not self.died_pieces:
+            return 0
+        return bits_hash(self.previous_black, self.keys[0]) ^ bits_hash(self.previous_white, self.keys[1])
+
+    def game_end(self, piece_type, action="MOVE"):
+        '''
+        Check if the game should end.
+
+        :param piece_type: 1('X') or 2('O').
+        :param action: "MOVE" or "PASS".
+        :return: boolean indicating whether the game should end.
+        '''
+        if self.n_move >= self.max_move:
+            return True
+        return action == "PASS" and self.black == self.previous_black and self.white == self.previous_white
+
+    def score(self, piece_type):
+        '''
+        Get score of a player by counting the number of stones.
+
+        :param piece_type: 1('X') or 2('O').
+        :return: number of stones of the player.
+        '''
+        return popcount(self.stones(piece_type))
@@ -0,0 +1,222 @@
+import numpy as np
+
+from bitboard import board_masks, flood, popcount, spread
+
+# Euler number contribution (times 4) of every 2x2 quad pattern of a player's stones,
+# bit 0 top-left, bit 1 top-right, bit 2 bottom-left, bit 3 bottom-right: Q1 +1, Q3 -1, diagonal Q2 +2
+QUAD_EULER = tuple(
+    1 if bin(pattern).count("1") == 1 else -1 if bin(pattern).count("1") == 3 else 2 if pattern in (0b1001, 0b0110) else 0
+    for pattern in range(16)
+)
+# Liberty difference is clipped to this range
+LIBERTY_CLIP = 20
+
+def weights(move_num, piece_type):
+    '''
+    Feature weights of the evaluation.
+
+    :param move_num: number of moves played at the evaluated position.
+    :param piece_type: 1('X') or 2('O'), the side the position is evaluated for.
+    :return: stone, liberty, edge and Euler weights.
+    '''
+    # Weights (White): 7+3, 1, -3+3, -6 worked
+    stone_weight = 7 + (3*move_num/24)
+    liberty_weight = 1
+    edge_weight = min(0, -3 + (3*move_num/24))
+    euler_weight = -6
+
+    # Weights (Black): 0+10, 0.5, -2+4, -7 worked
+    if piece_type == 1:
+        stone_weight = 0 + (10*move_num/24)
+        liberty_weight = 0.5
+        edge_weight = min(0, -2 + (4*move_num/24))
+        euler_weight = -7
+
+    # Weight for end game state
+    if move_num >= 23:
+        stone_weight = 10000
+    return stone_weight, liberty_weight, edge_weight, euler_weight
+
+class Evaluator():
+    '''
+    Heuristic evaluation on bitboards, based on the research from the paper:
+    https://citeseerx.ist.psu.edu/document?repid=rep1&type=pdf&doi=fb0b18e490d1d2d60e53f56b1707d7111299078f
+    Stone count, liberties, edge stones and Euler number, each found with masks and popcounts.
+    '''
+
+    def __init__(self, n=5):
+        '''
+        :param n: size of the board n*n
+        '''
+        self.n = n
+        self.masks = board_masks(n)
+        self.edge = 0
+        for i in range(n):
+            for j in range(n):
+                if i == 0 or i == n - 1 or j == 0 or j == n - 1:
+                    self.edge |= 1 << (i * n + j)
+        # Quads are read on a board padded with an empty border, width n + 2
+        self.width = n + 2
+        self.windows = 0
+        for y in range(n + 1):
+            for x in range(n + 1):
+                self.windows |= 1 << (y * self.width + x)
+        self.row_mask = (1 << n) - 1
+        self.patterns = [(pattern, weight) for pattern, weight in enumerate(QUAD_EULER) if weight]
+        # Batch path: boards are rows of n * n points, index n * n stands for off the board
+        self.edge_array = np.array([self.edge >> p & 1 for p in range(n * n)], dtype=bool)
+        self.neighbor_index = np.array([[x * n + y if 0 <= x < n and 0 <= y < n else n * n
+                                         for x, y in ((i - 1, j), (i + 1, j), (i, j - 1), (i, j + 1))]
+                                        for i in range(n) for j in range(n)])
+        self.quad_index = np.array([[x * n + y if 0 <= x < n and 0 <= y < n else n * n
+                                     for x, y in ((i, j), (i, j + 1), (i + 1, j), (i + 1, j + 1))]
+                                    for i in range(-1, n) for j in range(-1, n)])
+        self.quad_table = np.array(QUAD_EULER)
+
+    def pad(self, bits):
+        ''' Move the stones of an n*n bitboard into the padded (n + 2)-wide layout '''
+        n = self.n
+        padded = 0
+        for i in range(n):
+            padded |= ((bits >> (i * n)) & self.row_mask) << ((i + 1) * self.width + 1)
+        return padded
+
+    def liberties(self, own, empty):
+        ''' Sum over the groups of own of their number of liberties '''
+        n = self.n
+        masks = self.masks
+        total = 0
+        remaining = own
+        while remaining:
+            group = flood(remaining & -remaining, own, n, masks)
+            total += popcount(spread(group, n, masks) & empty)
+            remaining &= ~group
+        return total
+
+    def euler(self, own):
+        ''' Euler number of own stones from 2x2 quad counts: (Q1 - Q3 + 2 * Qd) / 4 '''
+        padded = self.pad(own)
+        width = self.width
+        cells = (padded, padded >> 1, padded >> width, padded >> (width + 1))
+        windows = self.windows
+        total = 0
+        for pattern, weight in self.patterns:
+            match = windows
+            for k in range(4):
+                match &= cells[k] if pattern >> k & 1 else ~cells[k]
+            total += weight * popcount(match)
+        return total / 4
+
+    def evaluate(self, black, white, move_num, piece_type):
+        '''
+        Evaluation of one position.
+
+        :param black: bitboard of the black stones.
+        :param white: bitboard of the white stones.
+        :param move_num: number of moves played.
+        :param piece_type: 1('X') or 2('O'), the side the position is evaluated for.
+        :return: heuristic value for piece_type.
+        '''
+        own, other = (black, white) if piece_type == 1 else (white, black)
+        empty = self.masks[0] & ~(black | white)
+
+        # Maximize stones on board
+        my_stones = popcount(own)
+        opponent_stones = popcount(other)
+        if piece_type == 1: # I'm playing Black
+            opponent_stones += 2.5
+        elif piece_type == 2: # I'm playing White
+            my_stones += 2.5
+        stone_score = my_stones - opponent_stones
+
+        # Maximize liberties
+        liberty_score = self.liberties(own, empty) - self.liberties(other, empty)
+
+        # Avoid moves on edge
+        edge_penalty = popcount(own & self.edge)
+
+        # Connect stones & make eyes (Euler number)
+        euler_score = self.euler(own)
+
+        stone_weight, liberty_weight, edge_weight, euler_weight = weights(move_num, piece_type)
+        return (
+            stone_weight * stone_score +
+            liberty_weight * min(max(liberty_score, -LIBERTY_CLIP), LIBERTY_CLIP) +
+            edge_weight * edge_penalty +
+            euler_weight * euler_score
+        )
+
+    def to_arrays(self, bitboards):
+        ''' (count, n * n) boolean arrays of a sequence of bitboards '''
+        bits = np.array(bitboards, dtype=np.int64).reshape(-1, 1)
+        return ((bits >> np.arange(self.n * self.n)) & 1).astype(bool)
+
+    def batch_liberties(self, own, empty):
+        '''
+        Sum over the groups of their number of liberties, for many boards: groups are labeled by propagating
+        the smallest point index, then every empty point counts the distinct groups next to it.
+
+        :param own: (count, n * n) boolean array of a player's stones.
+        :param empty: (count, n * n) boolean array of the empty points.
+        :return: (count,) integer array.
+        '''
+        none = self.n * self.n
+        count = len(own)
+        labels = np.full((count, none + 1), none)
+        labels[:, :none] = np.where(own, np.arange(none), none)
+        while True:
+            smallest = np.minimum(labels[:, :none], labels[:, self.neighbor_index].min(axis=2))
+            smallest = np.where(own, smallest, none)
+            if np.array_equal(smallest, labels[:, :none]):
+                break
+            labels[:, :none] = smallest
+        around = labels[:, self.neighbor_index]
+        distinct = around[:, :, 0] != none
+        distinct = distinct.astype(np.int64)
+        for k in range(1, 4):
+            new = around[:, :, k] != none
+            for earlier in range(k):
+                new &= around[:, :, k] != around[:, :, earlier]
+            distinct += new
+        return (distinct * empty).sum(axis=1)
+
+    def batch_euler(self, own):
+        ''' Euler numbers of many boards, from a lookup of every 2x2 quad pattern '''
+        cells = np.zeros((len(own), self.n * self.n + 1), dtype=np.int64)
+        cells[:, :-1] = own
+        quads = cells[:, self.quad_index]
+        pattern = quads[:, :, 0] + 2 * quads[:, :, 1] + 4 * quads[:, :, 2] + 8 * quads[:, :, 3]
+        return self.quad_table[pattern].sum(axis=1) / 4
+
+    def evaluate_batch(self, blacks, whites, move_num, piece_type):
+        '''
+        Evaluation of many positions at once, equal to evaluate on each.
+
+        :param blacks: sequence of black bitboards.
+        :param whites: sequence of white bitboards, same length.
+        :param move_num: number of moves played.
+        :param piece_type: 1('X') or 2('O'), the side the positions are evaluated for.
+        :return: (count,) float array.
+        '''
+        black = self.to_arrays(blacks)
+        white = self.to_arrays(whites)
+        own, other = (black, white) if piece_type == 1 else (white, black)
+        empty = ~(black | white)
+
+        my_stones = own.sum(axis=1)
+        opponent_stones = other.sum(axis=1)
+        if piece_type == 1:
+            stone_score = my_stones - (opponent_stones + 2.5)
+        else:
+            stone_score = (my_stones + 2.5) - opponent_stones
+        liberty_score = self.batch_liberties(own, empty) - self.batch_liberties(other, empty)
+        edge_penalty = (own & self.edge_array).sum(axis=1)
+        euler_score = self.batch_euler(own)
+
+        stone_weight, liberty_weight, edge_weight, euler_weight = weights(move_num, piece_type)
+        return (
+            stone_weight * stone_score +
+            liberty_weight * np.clip(liberty_score, -LIBERTY_CLIP, LIBERTY_CLIP) +
+            edge_weight * edge_penalty +
+            euler_weight * euler_score
+        )
@@ -5,10 +5,58 @@ import math
 import argparse
 from collections import Counter
 from copy import deepcopy
+from functools import lru_cache
 
 from read import *
 from write import writeNextInput
 
+@lru_cache(maxsize=None)
+def neighbor_table(n):
+    '''
+    Neighbors of every point of an n*n board.
+
+    :param n: width and height of the board.
+    :return: table[i][j] is a tuple of the (row, column) neighbors of (i, j).
+    '''
+    return tuple(tuple(tuple((x, y) for x, y in ((i-1, j), (i+1, j), (i, j-1), (i, j+1)) if 0 <= x < n and 0 <= y < n)
+                       for j in range(n)) for i in range(n))
+
+@lru_cache(maxsize=None)
+def zobrist_table(n):
+    '''
+    Zobrist keys of an n*n board, fixed for a given size.
+
+    :param n: width and height of the board.
+    :return: keys[piece_type - 1][i * n + j] is the random 64-bit key of a stone at (i, j).
+    '''
+    rng = random.Random(n)
+    return tuple(tuple(rng.getrandbits(64) for _ in range(n * n)) for _ in range(2))
+
+def board_hash(board):
+    '''
+    Zobrist hash of a board: XOR of the keys of its stones.
+
+    :param board: list-of-lists board.
+    :return: 64-bit integer.
+    '''
+    n = len(board)
+    keys = zobrist_table(n)
+    value = 0
+    for i in range(n):
+        for j in range(n):
+            if board[i][j] != 0:
+                value ^= keys[board[i][j] - 1][i * n + j]
+    return value
+
+class Chain:
+    ''' A group of connected stones of one color with the empty points next to it '''
+    __slots__ = ("color", "stones", "liberties")
+
+    def __init__(self, color, stones, liberties):
+        self.color = color
+        self.stones = stones
+        self.liberties = liberties
+
 class GO:
     def __init__(self, n):
         """
@@ -24,6 +72,30 @@ class GO:
         self.max_move = n * n - 1 # The max movement of a Go game
         self.komi = n/2 # Komi rule
         self.verbose = False # Verbose only when there is a manual player
+        self.chain_board = None # Board the chains were built for, they are rebuilt when a new board is assigned
+        self.undo_stack = [] # Moves made with make_move, undone with undo_move
+        self.hash = 0 # Zobrist hash of hash_board, kept up to date by the in-place moves
+        self.hash_board = None
+        self._previous_board = None # Derived from the last move when None after make_move
+
+    @property
+    def previous_board(self):
+        '''
+        Board before the last move. After make_move it is rebuilt from the move record on first use.
+        '''
+        if self._previous_board is None and self.undo_stack:
+            i, j, piece_type, captured = self.undo_stack[-1][:4]
+            previous_board = [row[:] for row in self.board]
+            if i is not None:
+                previous_board[i][j] = 0
+                for x, y in captured:
+                    previous_board[x][y] = 3 - piece_type
+            self._previous_board = previous_board
+        return self._previous_board
+
+    @previous_board.setter
+    def previous_board(self, previous_board):
+        self._previous_board = previous_board
 
     def init_board(self, n):
         '''
@@ -117,6 +189,8 @@ class GO:
         :param j: column number of the board.
         :return: a list containing the all allies row and column (row, column) of position (i, j).
         '''
+        if self.board[i][j] != 0:
+            return list(self.chain_at(i, j).stones)
         stack = [(i, j)]  # stack for DFS serach
         ally_members = []  # record allies positions during the search
         while stack:
@@ -137,14 +211,12 @@ class GO:
         :return: boolean indicating whether the given stone still has liberty.
         '''
         board = self.board
-        ally_members = self.ally_dfs(i, j)
-        for member in ally_members:
-            neighbors = self.detect_neighbor(member[0], member[1])
-            for piece in neighbors:
-                # If there is empty space around a piece, it has liberty
-                if board[piece[0]][piece[1]] == 0:
-                    return True
-        # If none of the pieces in a allied group has an empty space, it has no liberty
+        if board[i][j] != 0:
+            return len(self.chain_at(i, j).liberties) > 0
+        # An empty area has liberty unless it is a single point surrounded by stones
+        for piece in neighbor_table(self.size)[i][j]:
+            if board[piece[0]][piece[1]] == 0:
+                return True
         return False
 
     def find_died_pieces(self, piece_type):
@@ -154,17 +226,21 @@ class GO:
         :param piece_type: 1('X') or 2('O').
         :return: a list containing the dead pieces row and column(row, column).
         '''
-        board = self.board
         died_pieces = []
+        for chain in self.dead_chains(piece_type):
+            died_pieces.extend(chain.stones)
+        return sorted(died_pieces)
 
-        for i in range(len(board)):
-            for j in range(len(board)):
-                # Check if there is a piece at this position:
-                if board[i][j] == piece_type:
-                    # The piece die if it has no liberty
-                    if not self.find_liberty(i, j):
-                        died_pieces.append((i,j))
-        return died_pieces
+    def dead_chains(self, piece_type):
+        '''
+        Find the chains without liberty for a given piece type.
+
+        :param piece_type: 1('X') or 2('O').
+        :return: a list of Chain.
+        '''
+        self.build_chains()
+        chains = {chain for row in self.chains for chain in row if chain is not None}
+        return [chain for chain in chains if chain.color == piece_type and not chain.liberties]
 
     def remove_died_pieces(self, piece_type):
         '''
@@ -174,10 +250,11 @@ class GO:
         :return: locations of dead pieces.
         '''
 
-        died_pieces = self.find_died_pieces(piece_type)
-        if not died_pieces: return []
-        self.remove_certain_pieces(died_pieces)
-        return died_pieces
+        died_pieces = []
+        for chain in self.dead_chains(piece_type):
+            died_pieces.extend(chain.stones)
+            self.remove_chain(chain)
+        return sorted(died_pieces)
 
     def remove_certain_pieces(self, positions):
         '''
@@ -189,8 +266,125 @@ class GO:
         board = self.board
         for piece in positions:
             board[piece[0]][piece[1]] = 0
+        # Removing part of a chain can split it, the chains are rebuilt on the next query
         self.update_board(board)
 
+    def build_chains(self):
+        '''
+        Build the chains of the current board unless they are up to date.
+
+        :return: None.
+        '''
+        if self.chain_board is self.board:
+            return
+        board = self.board
+        n = len(board)
+        table = neighbor_table(n)
+        self.chains = [[None] * n for _ in range(n)]
+        for i in range(n):
+            for j in range(n):
+                if board[i][j] == 0 or self.chains[i][j] is not None:
+                    continue
+                chain = Chain(board[i][j], set(), set())
+                stack = [(i, j)]
+                self.chains[i][j] = chain
+                while stack:
+                    x, y = stack.pop()
+                    chain.stones.add((x, y))
+                    for a, b in table[x][y]:
+                        if board[a][b] == 0:
+                            chain.liberties.add((a, b))
+                        elif board[a][b] == chain.color and self.chains[a][b] is None:
+                            self.chains[a][b] = chain
+                            stack.append((a, b))
+        self.chain_board = board
+
+    def chain_at(self, i, j):
+        '''
+        Chain of a stone.
+
+        :param i: row number of the board.
+        :param j: column number of the board.
+        :return: Chain, or None if the point is empty.
+        '''
+        self.build_chains()
+        return self.chains[i][j]
+
+    def zobrist_hash(self):
+        '''
+        Zobrist hash of the current board, recomputed only when a new board was assigned.
+
+        :return: 64-bit integer.
+        '''
+        if self.hash_board is not self.board:
+            self.hash = board_hash(self.board)
+            self.hash_board = self.board
+        return self.hash
+
+    def ko_key(self):
+        '''
+        Hash of the KO state: the previous board matters only when the last move captured stones.
+
+        :return: 64-bit integer, 0 when KO cannot apply.
+        '''
+        return board_hash(self.previous_board) if self.died_pieces else 0
+
+    def add_stone(self, i, j, piece_type):
+        '''
+        Put a stone on an empty point and update the chains: merge with the allied chains next to it
+        and take the point from the liberties of the chains around.
+
+        :param i: row number of the board.
+        :param j: column number of the board.
+        :param piece_type: 1('X') or 2('O').
+        :return: the Chain of the new stone.
+        '''
+        self.build_chains()
+        board = self.board
+        chains = self.chains
+        board[i][j] = piece_type
+        if self.hash_board is board:
+            self.hash ^= zobrist_table(self.size)[piece_type - 1][i * self.size + j]
+        neighbors = neighbor_table(self.size)[i][j]
+        chain = Chain(piece_type, {(i, j)}, {piece for piece in neighbors if board[piece[0]][piece[1]] == 0})
+        chains[i][j] = chain
+        for x, y in neighbors:
+            other = chains[x][y]
+            if other is None or other is chain:
+                continue
+            other.liberties.discard((i, j))
+            if other.color == piece_type:
+                # Merge the smaller chain into the larger one
+                big, small = (other, chain) if len(other.stones) >= len(chain.stones) else (chain, other)
+                big.stones |= small.stones
+                big.liberties |= small.liberties
+                for a, b in small.stones:
+                    chains[a][b] = big
+                chain = big
+        return chain
+
+    def remove_chain(self, chain):
+        '''
+        Take a whole chain off the board, its points become liberties of the chains around.
+
+        :param chain: Chain on this board.
+        :return: None.
+        '''
+        board = self.board
+        chains = self.chains
+        table = neighbor_table(self.size)
+        if self.hash_board is board:
+            keys = zobrist_table(self.size)[chain.color - 1]
+            for x, y in chain.stones:
+                self.hash ^= keys[x * self.size + y]
+        for x, y in chain.stones:
+            board[x][y] = 0
+            chains[x][y] = None
+        for x, y in chain.stones:
+            for a, b in table[x][y]:
+                if chains[a][b] is not None:
+                    chains[a][b].liberties.add((x, y))
+
     def place_chess(self, i, j, piece_type):
         '''
         Place a chess stone in the board.
@@ -205,13 +399,108 @@ class GO:
         valid_place = self.valid_place_check(i, j, piece_type)
         if not valid_place:
             return False
-        self.previous_board = deepcopy(board)
-        board[i][j] = piece_type
-        self.update_board(board)
+        self.previous_board = [row[:] for row in board]
+        self.add_stone(i, j, piece_type)
         # Remove the following line for HW2 CS561 S2020
         # self.n_move += 1
         return True
 
+    def make_move(self, i, j, piece_type):
+        '''
+        Play a stone in place: place it, remove the captured opponent stones and update the KO state,
+        pushing what is needed to take the move back on the undo stack. Nothing is copied.
+
+        :param i: row number of the board.
+        :param j: column number of the board.
+        :param piece_type: 1('X') or 2('O').
+        :return: boolean indicating whether the move was valid (nothing changes if not).
+        '''
+        if not self.valid_place_check(i, j, piece_type, test_check=True):
+            return False
+        previous_hash = self.zobrist_hash()
+        self.add_stone(i, j, piece_type)
+        captured = []
+        for chain in self.dead_chains(3 - piece_type):
+            captured.extend(chain.stones)
+            self.remove_chain(chain)
+        captured.sort()
+        self.undo_stack.append((i, j, piece_type, captured, self._previous_board, self.died_pieces, previous_hash))
+        self._previous_board = None
+        self.died_pieces = captured
+        return True
+
+    def make_pass(self):
+        '''
+        Pass in place: the previous board becomes the current one.
+
+        :return: None.
+        '''
+        self.undo_stack.append((None, None, None, [], self._previous_board, self.died_pieces, self.zobrist_hash()))
+        self._previous_board = None
+
+    def undo_move(self):
+        '''
+        Take back the last make_move or make_pass: remove the stone, put the captured stones back
+        and restore the KO state.
+
+        :return: None.
+        '''
+        i, j, piece_type, captured, previous_board, died_pieces, previous_hash = self.undo_stack.pop()
+        if i is not None:
+            board = self.board
+            board[i][j] = 0
+            for x, y in captured:
+                board[x][y] = 3 - piece_type
+            # Taking a stone back can split its chain, the chains are rebuilt on the next query
+            self.chain_board = None
+            self.hash = previous_hash
+            self.hash_board = board
+        self._previous_board = previous_board
+        self.died_pieces = died_pieces
+
+    def legal_moves(self, piece_type):
+        '''
+        All valid placements at once, from the chains: an empty point is valid if it has an empty neighbor,
+        touches an allied chain with another liberty, or takes the last liberty of an opponent chain
+        without repeating the previous board (KO). Same result as valid_place_check on every point.
+
+        :param piece_type: 1('X') or 2('O').
+        :return: bit mask of the valid points, bit i * n + j for (i, j).
+        '''
+        self.build_chains()
+        board = self.board
+        chains = self.chains
+        n = self.size
+        table = neighbor_table(n)
+        safe = set()
+        capturing = set()
+        dead = False
+        for row in chains:
+            for chain in row:
+                if chain is None:
+                    continue
+                if chain.color == piece_type:
+                    if len(chain.liberties) > 1:
+                        safe |= chain.liberties
+                elif len(chain.liberties) == 1:
+                    capturing |= chain.liberties
+                elif not chain.liberties:
+                    dead = True
+        mask = 0
+        for i in range(n):
+            for j in range(n):
+                if board[i][j] != 0:
+                    continue
+                if (i, j) in safe or any(board[x][y] == 0 for x, y in table[i][j]):
+                    mask |= 1 << (i * n + j)
+                # Captures can only be undone by KO, or come from chains already without liberty
+                elif dead or ((i, j) in capturing and self.died_pieces):
+                    if self.valid_place_check(i, j, piece_type, test_check=True):
+                        mask |= 1 << (i * n + j)
+                elif (i, j) in capturing:
+                    mask |= 1 << (i * n + j)
+        return mask
+
     def valid_place_check(self, i, j, piece_type, test_check=False):
         '''
         Check whether a placement is valid.
@@ -243,26 +532,43 @@ class GO:
                 print('Invalid placement. There is already a chess in this position.')
             return False
         
-        # Copy the board for testing
-        test_go = self.copy_board()
-        test_board = test_go.board
-
-        # Check if the place has liberty
-        test_board[i][j] = piece_type
-        test_go.update_board(test_board)
-        if test_go.find_liberty(i, j):
-            return True
+        # Check if the place has liberty: an empty neighbor or an allied chain with another liberty
+        self.build_chains()
+        chains = self.chains
+        neighbors = neighbor_table(self.size)[i][j]
+        group = {(i, j)}
+        for x, y in neighbors:
+            if board[x][y] == 0:
+                return True
+            if board[x][y] == piece_type:
+                if len(chains[x][y].liberties) > 1:
+                    return True
+                group |= chains[x][y].stones
 
         # If not, remove the died pieces of opponent and check again
-        test_go.remove_died_pieces(3 - piece_type)
-        if not test_go.find_liberty(i, j):
+        died = set()
+        for row in chains:
+            for chain in row:
+                if chain is not None and chain.color != piece_type and chain.liberties <= {(i, j)}:
+                    died |= chain.stones
+        if not any(piece in died for member in group for piece in neighbor_table(self.size)[member[0]][member[1]]):
             if verbose:
                 print('Invalid placement. No liberty found in this position.')
             return False
 
         # Check special case: repeat placement causing the repeat board state (KO rule)
-        else:
-            if self.died_pieces and self.compare_board(self.previous_board, test_go.board):
+        if self.died_pieces:
+            previous_board = self.previous_board
+            repeat = True
+            for x in range(len(board)):
+                for y in range(len(board)):
+                    value = piece_type if (x, y) == (i, j) else 0 if (x, y) in died else board[x][y]
+                    if previous_board[x][y] != value:
+                        repeat = False
+                        break
+                if not repeat:
+                    break
+            if repeat:
                 if verbose:
                     print('Invalid placement. A repeat move not permitted by the KO rule.')
                 return False
@@ -270,12 +576,14 @@ class GO:
         
     def update_board(self, new_board):
         '''
-        Update the board with new_board
+        Update the board with new_board. Call it after editing the board in place so the chains are rebuilt.
 
         :param new_board: new board.
         :return: None.
         '''   
         self.board = new_board
+        self.chain_board = None
+        self.hash_board = None
 
     def visualize_board(self):
         '''
@@ -362,12 +670,13 @@ class GO:
             self.visualize_board()
         
         verbose = self.verbose
+        passed = False
         # Game starts!
         while 1:
             piece_type = 1 if self.X_move else 2
 
             # Judge if the game should end
-            if self.game_end(piece_type):       
+            if passed or self.game_end(piece_type):       
                 result = self.judge_winner()
                 if verbose:
                     print('Game ended.')
@@ -394,11 +703,19 @@ class GO:
                 if not self.place_chess(action[0], action[1], piece_type):
                     if verbose:
                         self.visualize_board() 
+                    # Only a manual player gets to retry, an agent loses as in judge
+                    player = player1 if piece_type == 1 else player2
+                    if player.type != 'manual':
+                        if verbose:
+                            print('The winner is {}'.format('X' if 3 - piece_type == 1 else 'O'))
+                        return 3 - piece_type
                     continue
 
                 self.died_pieces = self.remove_died_pieces(3 - piece_type) # Remove the dead pieces of opponent
             else:
-                self.previous_board = deepcopy(self.board)
+                # Two passes in a row end the game
+                passed = self.game_end(piece_type, action)
+                self.previous_board = [row[:] for row in self.board]
 
             if verbose:
                 self.visualize_board() # Visualize the board again
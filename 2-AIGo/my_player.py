@@ -4,17 +4,83 @@ import os
 import math
 from read import readInput
 from write import writeOutput
-from host import GO
+from bitboard import BitGO, bits_to_positions
+from evaluation import Evaluator
 import time
-from collections import deque
+
+# Bound types of transposition table entries
+EXACT, LOWER, UPPER = 0, 1, 2
+# Slots in the transposition table (a power of two)
+TT_SIZE = 1 << 16
+# Moves to order from which the NumPy batch evaluation is faster than one evaluation per move
+BATCH_MOVES = 20
+
+class TranspositionTable():
+    ''' Fixed-size table of searched positions: depth, bound type, value and best move per slot '''
+
+    def __init__(self, size=TT_SIZE):
+        self.mask = size - 1
+        self.slots = [None] * size
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.replacements = 0
+        self.rejections = 0
+
+    def new_search(self):
+        ''' Age the entries: those of earlier searches are replaced first '''
+        self.generation += 1
+
+    def probe(self, key):
+        ''' Entry (key, depth, flag, value, move, generation) stored for key, or None '''
+        self.probes += 1
+        entry = self.slots[hash(key) & self.mask]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key, depth, flag, value, move):
+        ''' Store a result, replacing an empty slot, the same position, an older search or a shallower entry '''
+        index = hash(key) & self.mask
+        old = self.slots[index]
+        if old is not None and old[0] != key:
+            if old[5] == self.generation and old[1] > depth:
+                self.rejections += 1
+                return
+            self.replacements += 1
+        self.slots[index] = (key, depth, flag, value, move, self.generation)
+        self.stores += 1
+
+    def stats(self):
+        ''' Probe, hit and store counts '''
+        return {
+            "probes": self.probes,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.probes, 4) if self.probes else 0.0,
+            "stores": self.stores,
+            "replacements": self.replacements,
+            "rejections": self.rejections,
+        }
 
 class MyPlayer():
-    def __init__(self):
-        self.TIME_LIMIT = 9.5  # Move in 10 sec (9.5s)
+    def __init__(self, go, filename="num_move.txt", time_limit=9.5):
+        '''
+        :param go: Go instance of the position to play.
+        :param filename: file keeping the number of moves between runs, None to take it from go.n_move.
+        :param time_limit: seconds per move.
+        '''
+        self.type = 'my'
+        self.TIME_LIMIT = time_limit  # Move in 10 sec (9.5s)
         self.start_time = None
-        self.filename = "num_move.txt"
-        self.init_num_move(go)
-        self.num_move = self.num_moves()
+        self.filename = filename
+        self.num_move = 0
+        if self.filename:
+            self.init_num_move(go)
+            self.num_move = self.num_moves()
+        self.table = TranspositionTable()
+        self.evaluator = Evaluator(go.size)
 
     def init_num_move(self, go):
         ''' Initialize numebr of moves file '''
@@ -38,6 +104,8 @@ class MyPlayer():
         
     def update_num_move(self):
         ''' Update number of moves'''
+        if not self.filename:
+            return
         move_count = self.num_move + 2
         if self.num_move >= 22:
             print("Deleting move number file")
@@ -51,15 +119,19 @@ class MyPlayer():
     def get_input(self, go, piece_type):
         ''' Get move wiht alpha-beta pruning '''
         self.start_time = time.time()
+
+        # Number of moves from the game when it is not kept in a file
+        if not self.filename:
+            self.num_move = go.n_move
         
         # Check if first move of game
         if self.num_move <= 1:
-            self.start_move()
+            self.start_move(go, piece_type)
         
         # Otherwise use alpha-beta search
-        return self.run_search()
+        return self.run_search(go, piece_type)
     
-    def start_move(self):
+    def start_move(self, go, piece_type):
         ''' Opening move for each side '''
         if piece_type == 1:  # Black's first move
             self.update_num_move()
@@ -75,11 +147,12 @@ class MyPlayer():
             else:  # (3,3)
                 return (3, 3)
 
-    def run_search(self):
+    def run_search(self, go, piece_type):
         ''' Call alpha-beta search '''
         best_move = None
         max_depth = 4
         depth = 1
+        self.table.new_search()
         while (time.time() - self.start_time < self.TIME_LIMIT) and (depth <= (max_depth + (max(0, self.num_move - 8) / 4))):
             move = self.alpha_beta_search(go, piece_type, depth)
             if move:
@@ -87,6 +160,7 @@ class MyPlayer():
             print("The depth searched was: " + str(depth))
             depth += 1
         print("This move took: " + str(time.time() - self.start_time))
+        print("Transposition table: " + str(self.table.stats()))
         self.update_num_move()
         return best_move if best_move else "PASS"
 
@@ -103,192 +177,136 @@ class MyPlayer():
         if not possible_moves:
             return "PASS"
 
+        # Best move of the previous iteration first
+        key = self.table_key(go, self.num_move, piece_type, piece_type)
+        entry = self.table.probe(key)
+        if entry and entry[4] in possible_moves:
+            possible_moves.remove(entry[4])
+            possible_moves.insert(0, entry[4])
+
         for move in possible_moves:
-            new_go = self.simulate_move(go, move, piece_type)
-            value = self.minimax(new_go, depth - 1, self.num_move + 1, alpha, beta, False, piece_type)
+            go.make_move(move[0], move[1], piece_type)
+            value = self.minimax(go, depth - 1, self.num_move + 1, alpha, beta, False, piece_type)
+            go.undo_move()
             if value > best_value:
                 best_value = value
                 best_move = move
             alpha = max(alpha, best_value)
-        
+
+        if time.time() - self.start_time <= self.TIME_LIMIT:
+            self.table.store(key, depth, EXACT, best_value, best_move)
         return best_move
 
+    def table_key(self, go, move_num, to_move, piece_type):
+        '''
+        Transposition table key: board and KO state hashes, side to move, move number and the side values are
+        computed for (the evaluation depends on both).
+        '''
+        return (go.zobrist_hash(), go.ko_key(), to_move, move_num, piece_type)
+
     def minimax(self, go, depth, move_num, alpha, beta, maximizing, piece_type):
         ''' Minimax with alpha-beta pruning '''
         if depth == 0 or (time.time() - self.start_time > self.TIME_LIMIT):
             return self.evaluate(go, move_num, piece_type)
 
         opponent = 3 - piece_type
-        possible_moves = self.get_valid_moves(go, move_num, piece_type if maximizing else opponent)
+        to_move = piece_type if maximizing else opponent
+
+        # Reuse a result searched at least as deep, or at least narrow the window
+        key = self.table_key(go, move_num, to_move, piece_type)
+        entry = self.table.probe(key)
+        if entry and entry[1] >= depth:
+            flag, value = entry[2], entry[3]
+            if flag == EXACT:
+                return value
+            if flag == LOWER:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if beta <= alpha:
+                return value
+        alpha_start, beta_start = alpha, beta
+
+        possible_moves = self.get_valid_moves(go, move_num, to_move)
 
         if not possible_moves:
             return self.evaluate(go, move_num, piece_type)
 
+        # Try the stored best move first
+        if entry and entry[4] in possible_moves:
+            possible_moves.remove(entry[4])
+            possible_moves.insert(0, entry[4])
+
+        best_move = None
         if maximizing:
             max_eval = -float('inf')
             for move in possible_moves:
-                new_go = self.simulate_move(go, move, piece_type)
-                eval = self.minimax(new_go, depth - 1, move_num + 1, alpha, beta, False, piece_type)
-                max_eval = max(max_eval, eval)
+                go.make_move(move[0], move[1], piece_type)
+                eval = self.minimax(go, depth - 1, move_num + 1, alpha, beta, False, piece_type)
+                go.undo_move()
+                if eval > max_eval:
+                    max_eval = eval
+                    best_move = move
                 alpha = max(alpha, eval)
                 if beta <= alpha:
                     break
-            return max_eval
+            value = max_eval
         else:
             min_eval = float('inf')
             for move in possible_moves:
-                new_go = self.simulate_move(go, move, opponent)
-                eval = self.minimax(new_go, depth - 1, move_num + 1, alpha, beta, True, piece_type)
-                min_eval = min(min_eval, eval)
+                go.make_move(move[0], move[1], opponent)
+                eval = self.minimax(go, depth - 1, move_num + 1, alpha, beta, True, piece_type)
+                go.undo_move()
+                if eval < min_eval:
+                    min_eval = eval
+                    best_move = move
                 beta = min(beta, eval)
                 if beta <= alpha:
                     break
-            return min_eval
+            value = min_eval
+
+        # Values cut short by the time limit are not stored
+        if time.time() - self.start_time <= self.TIME_LIMIT:
+            flag = UPPER if value <= alpha_start else LOWER if value >= beta_start else EXACT
+            self.table.store(key, depth, flag, value, best_move)
+        return value
     
     def evaluate(self, go, move_num, piece_type):
         ''' Heuristic function based on the research from the paper: https://citeseerx.ist.psu.edu/document?repid=rep1&type=pdf&doi=fb0b18e490d1d2d60e53f56b1707d7111299078f '''
-        opponent = 3 - piece_type
+        return self.evaluator.evaluate(go.black, go.white, move_num, piece_type)
 
-        # Maximize stones on board
-        my_stones = sum(row.count(piece_type) for row in go.board)
-        opponent_stones = sum(row.count(opponent) for row in go.board)
-        if piece_type == 1: # I'm playing Black
-            opponent_stones += 2.5
-        elif piece_type == 2: # I'm playing White
-            my_stones += 2.5
-        stone_score = my_stones - opponent_stones
-
-        # Maximize liberties
-        my_liberties = self.calculate_liberties(go, piece_type)
-        opponent_liberties = self.calculate_liberties(go, opponent)
-        liberty_score = my_liberties - opponent_liberties
-
-        # Avoid moves on edge
-        edge_penalty = self.calculate_edge_penalty(go, piece_type)
-
-        # Connect stones & make eyes (Euler number)
-        euler_score = self.calculate_euler_score(go, piece_type)
-
-        # Weights (White): 7+3, 1, -3+3, -6 worked
-        stone_weight = 7 + (3*move_num/24)
-        liberty_weight = 1
-        edge_weight = min(0, -3 + (3*move_num/24))
-        euler_weight = -6
-        
-        # Weights (Black): 0+10, 0.5, -2+4, -7 worked
-        if piece_type ==  1:
-            stone_weight = 0 + (10*move_num/24)
-            liberty_weight = 0.5
-            edge_weight = min(0, -2 + (4*move_num/24))
-            euler_weight = -7
-        
-        # Weight for end game state
-        if move_num >= 23:
-            stone_weight = 10000
-
-        evaluation = (
-            stone_weight * stone_score +
-            liberty_weight * min(max(liberty_score, -20), 20) +
-            edge_weight * edge_penalty +
-            euler_weight * euler_score
-        )
-
-        return evaluation
-
-    def calculate_liberties(self, go, piece_type):
-        ''' Calculate liberties '''
-        liberties = 0
-        visited = set()
-        for i in range(go.size):
-            for j in range(go.size):
-                if go.board[i][j] == piece_type and (i, j) not in visited:
-                    queue = deque()
-                    queue.append((i, j))
-                    liberty = set()
-                    while queue:
-                        x, y = queue.popleft()
-                        if (x, y) in visited:
-                            continue
-                        visited.add((x, y))
-                        for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                            nx, ny = x + dx, y + dy
-                            if 0 <= nx < go.size and 0 <= ny < go.size:
-                                if go.board[nx][ny] == 0:
-                                    liberty.add((nx, ny))
-                                elif go.board[nx][ny] == piece_type:
-                                    queue.append((nx, ny))
-                    liberties += len(liberty)
-        return liberties
-
-    def calculate_edge_penalty(self, go, piece_type):
-        ''' Penalize moves on the edge '''
-        edge_penalty = 0
-        for i in range(go.size):
-            for j in range(go.size):
-                if go.board[i][j] == piece_type and (i == 0 or i == go.size - 1 or j == 0 or j == go.size - 1):
-                    edge_penalty += 1
-        return edge_penalty
-
-    def calculate_euler_score(self, go, piece_type):
-        ''' Calculate Euler number using 2x2 quad method, idea based on the paper: https://citeseerx.ist.psu.edu/document?repid=rep1&type=pdf&doi=fb0b18e490d1d2d60e53f56b1707d7111299078f  '''
-        n_Q1 = 0
-        n_Q3 = 0
-        n_Qd = 0
-
-        # Slide 2x2 window over the board
-        for i in range(-1, go.size):
-            for j in range(-1, go.size):
-                window = [[0, 0], [0, 0]]
-
-                # Fill the window, with out of bounds as 0
-                for x in range(2):
-                    for y in range(2):
-                        if 0 <= i + x < go.size and 0 <= j + y < go.size:
-                            window[x][y] = go.board[i + x][j + y]
-                        else:
-                            window[x][y] = 0
-
-                # Count the number of player's stones in the window
-                count = sum(row.count(piece_type) for row in window)
-
-                # Check for Q1, Q3, and Qd
-                if count == 1:
-                    n_Q1 += 1
-                elif count == 3:
-                    n_Q3 += 1
-                elif count == 2:
-                    if (window[0][0] == piece_type and window[1][1] == piece_type) or (window[0][1] == piece_type and window[1][0] == piece_type):
-                        n_Qd += 1
-
-        euler_number = (n_Q1 - n_Q3 + 2 * n_Qd) / 4
-        return euler_number
-    
     def get_valid_moves(self, go, move_nums, piece_type):
         ''' Get ordered possible moves '''
-        valid_moves = [(i, j) for i in range(go.size) for j in range(go.size) if go.valid_place_check(i, j, piece_type, test_check=True)]
-        scored_moves = [(move, self.score_move(go, move, move_nums, piece_type)) for move in valid_moves]
+        valid_moves = bits_to_positions(go.legal_moves(piece_type), go.size)
+        if len(valid_moves) >= BATCH_MOVES:
+            scored_moves = list(zip(valid_moves, self.score_moves(go, valid_moves, move_nums, piece_type)))
+        else:
+            scored_moves = [(move, self.score_move(go, move, move_nums, piece_type)) for move in valid_moves]
         scored_moves.sort(key=lambda x: x[1], reverse=True)
         return [move for move, _ in scored_moves]
 
-    def simulate_move(self, go, move, piece_type):
-        ''' Simulates move and returns new board '''
-        new_go = GO(go.size)
-        new_go.board = [row[:] for row in go.board]
-        new_go.place_chess(move[0], move[1], piece_type)
-        new_go.remove_died_pieces(3 - piece_type)
-        return new_go
-    
     def score_move(self, go, move, move_nums, piece_type):
         ''' Score move based on potential game state '''
-        new_go = self.simulate_move(go, move, piece_type)
-        score = self.evaluate(new_go, move_nums, piece_type)
+        go.make_move(move[0], move[1], piece_type)
+        score = self.evaluate(go, move_nums, piece_type)
+        go.undo_move()
         return score
 
+    def score_moves(self, go, moves, move_nums, piece_type):
+        ''' Score many moves with one batch evaluation of their game states '''
+        blacks, whites = [], []
+        for move in moves:
+            go.make_move(move[0], move[1], piece_type)
+            blacks.append(go.black)
+            whites.append(go.white)
+            go.undo_move()
+        return self.evaluator.evaluate_batch(blacks, whites, move_nums, piece_type).tolist()
+
 if __name__ == "__main__":
     N = 5
     piece_type, previous_board, board = readInput(N)
-    go = GO(N)
+    go = BitGO(N)
     go.set_board(piece_type, previous_board, board)
-    player = MyPlayer()
+    player = MyPlayer(go)
     action = player.get_input(go, piece_type)
     writeOutput(action)
\ No newline at end of file
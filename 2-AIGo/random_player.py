@@ -3,7 +3,7 @@ import sys
 from read import readInput
 from write import writeOutput
 
-from host import GO
+from bitboard import BitGO, bits_to_positions
 
 class RandomPlayer():
     def __init__(self):
@@ -17,11 +17,7 @@ class RandomPlayer():
         :param piece_type: 1('X') or 2('O').
         :return: (row, column) coordinate of input.
         '''        
-        possible_placements = []
-        for i in range(go.size):
-            for j in range(go.size):
-                if go.valid_place_check(i, j, piece_type, test_check = True):
-                    possible_placements.append((i,j))
+        possible_placements = bits_to_positions(go.legal_moves(piece_type), go.size)
 
         if not possible_placements:
             return "PASS"
@@ -31,7 +27,7 @@ class RandomPlayer():
 if __name__ == "__main__":
     N = 5
     piece_type, previous_board, board = readInput(N)
-    go = GO(N)
+    go = BitGO(N)
     go.set_board(piece_type, previous_board, board)
     player = RandomPlayer()
     action = player.get_input(go, piece_type)
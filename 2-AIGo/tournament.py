@@ -0,0 +1,181 @@
+import argparse, contextlib, io, json, os, random, shlex, subprocess, sys, tempfile, time
+import multiprocessing as mp
+
+from bitboard import BitGO
+from my_player import MyPlayer
+from random_player import RandomPlayer
+from read import readOutput
+from write import writeNextInput
+
+# Board size of the games
+BOARD_SIZE = 5
+# Games per color when the command line does not say
+TOURNAMENT_GAMES = 100
+# Agents played in-process, any other name is run as a command
+IN_PROCESS_AGENTS = ("my", "random")
+
+class ExternalPlayer():
+    '''
+    Agent run as a separate program with the file protocol of build.sh: every move it reads input.txt and writes
+    output.txt in its working directory. The directory is kept for the whole game, so files the agent keeps
+    between moves (like num_move.txt) belong to that game only.
+    '''
+
+    def __init__(self, command, workdir):
+        '''
+        :param command: command line of the agent, relative paths are taken from the current directory.
+        :param workdir: working directory of the agent, created if needed.
+        '''
+        self.type = 'external'
+        self.args = [os.path.abspath(arg) if os.path.exists(arg) else arg for arg in shlex.split(command)]
+        self.workdir = workdir
+        os.makedirs(workdir, exist_ok=True)
+
+    def get_input(self, go, piece_type):
+        '''
+        Get one input.
+
+        :param go: Go instance.
+        :param piece_type: 1('X') or 2('O').
+        :return: (row, column) coordinate of input, (-1, -1) if the agent gave no valid output.
+        '''
+        output_path = os.path.join(self.workdir, "output.txt")
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        writeNextInput(piece_type, go.previous_board, go.board, os.path.join(self.workdir, "input.txt"))
+        subprocess.run(self.args, cwd=self.workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            action, x, y = readOutput(output_path)
+        except Exception:
+            # Like judge, a missing or invalid output loses the game
+            return (-1, -1)
+        return "PASS" if action == "PASS" else (x, y)
+
+def make_player(spec, go, workdir, time_limit=None):
+    '''
+    Player of a game from its name in IN_PROCESS_AGENTS or a command line.
+
+    :param go: Go instance the game is played on.
+    :param workdir: working directory of an external agent.
+    :param time_limit: seconds per move of MyPlayer, its own limit if None.
+    '''
+    if spec == "random":
+        return RandomPlayer()
+    if spec == "my":
+        if time_limit is None:
+            return MyPlayer(go, filename=None)
+        return MyPlayer(go, filename=None, time_limit=time_limit)
+    return ExternalPlayer(spec, workdir)
+
+def play_game(black, white, color, seed=0, time_limit=None):
+    '''
+    Play one game with GO.play, the players' output is discarded.
+
+    :param black: agent playing Black (same for white).
+    :param color: color of the agent the results are counted for, 1('X') or 2('O').
+    :return: result dict with the winner (0 for a tie), or an "error" entry if the game could not be played.
+    '''
+    start_time = time.time()
+    result = {"black": black, "white": white, "color": color, "seed": seed}
+    random.seed(seed)
+    go = BitGO(BOARD_SIZE)
+    try:
+        with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(io.StringIO()):
+            player1 = make_player(black, go, os.path.join(workdir, "black"), time_limit)
+            player2 = make_player(white, go, os.path.join(workdir, "white"), time_limit)
+            result["winner"] = go.play(player1, player2)
+        result["moves"] = go.n_move
+    except Exception as e:
+        result["error"] = "{}: {}".format(type(e).__name__, e)
+    result["seconds"] = round(time.time() - start_time, 3)
+    return result
+
+def _play_game(args):
+    ''' Pool entry point '''
+    return play_game(*args)
+
+def plan_games(agent, opponent, games=TOURNAMENT_GAMES, seed=0):
+    '''
+    Games of agent against opponent, games as Black and games as White, alternating colors.
+
+    :return: list of (black, white, color of agent, seed) tuples.
+    '''
+    jobs = []
+    for i in range(games):
+        jobs.append((agent, opponent, 1, seed + 2 * i))
+        jobs.append((opponent, agent, 2, seed + 2 * i + 1))
+    return jobs
+
+def run_tournament(agent, opponent="random", games=TOURNAMENT_GAMES, processes=None, time_limit=None, seed=0):
+    '''
+    Play a tournament on a process pool, yielding results as games finish.
+
+    :param games: games per color.
+    :param processes: worker processes, CPU count by default.
+    :param time_limit: seconds per move of MyPlayer, its own limit if None.
+    :return: generator of result dicts, in completion order.
+    '''
+    jobs = [job + (time_limit,) for job in plan_games(agent, opponent, games, seed)]
+    processes = min(processes or os.cpu_count() or 1, max(1, len(jobs)))
+    if processes == 1:
+        for job in jobs:
+            yield _play_game(job)
+        return
+    with mp.Pool(processes) as pool:
+        # Games are short, so workers take them a few at a time
+        chunksize = max(1, len(jobs) // (processes * 8))
+        for result in pool.imap_unordered(_play_game, jobs, chunksize=chunksize):
+            yield result
+
+def summarize(results):
+    '''
+    Win, loss and tie counts of the agent for each color.
+
+    :return: {"black": {"win": ..., "lose": ..., "tie": ..., "error": ...}, "white": {...}}.
+    '''
+    summary = {name: {"win": 0, "lose": 0, "tie": 0, "error": 0} for name in ("black", "white")}
+    for result in results:
+        counts = summary["black" if result["color"] == 1 else "white"]
+        if "error" in result:
+            counts["error"] += 1
+        elif result["winner"] == 0:
+            counts["tie"] += 1
+        elif result["winner"] == result["color"]:
+            counts["win"] += 1
+        else:
+            counts["lose"] += 1
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    agent_help = "one of {} or the command of an external agent".format(", ".join(IN_PROCESS_AGENTS))
+    parser.add_argument("agent", help=agent_help)
+    parser.add_argument("opponent", nargs="?", help=agent_help, default="random")
+    parser.add_argument("--games", "-n", type=int, help="games per color", default=TOURNAMENT_GAMES)
+    parser.add_argument("--processes", "-p", type=int, help="worker processes", default=None)
+    parser.add_argument("--time", "-t", type=float, help="seconds per move of MyPlayer", default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--results", help="also append the JSON-lines results to this file", default=None)
+    args = parser.parse_args()
+
+    results = open(args.results, "a") if args.results else None
+    start_time = time.time()
+    finished = []
+    for result in run_tournament(args.agent, args.opponent, args.games, args.processes, args.time, args.seed):
+        finished.append(result)
+        if results:
+            results.write(json.dumps(result) + "\n")
+        if "error" in result:
+            print("Game {} vs {} failed: {}".format(result["black"], result["white"], result["error"]), file=sys.stderr)
+    if results:
+        results.close()
+    seconds = time.time() - start_time
+
+    print("=====Summary=====")
+    for name, counts in summarize(finished).items():
+        line = "You play as {} Player | Win: {} | Lose: {} | Tie: {}".format(name.capitalize(), counts["win"], counts["lose"], counts["tie"])
+        if counts["error"]:
+            line += " | Error: {}".format(counts["error"])
+        print(line)
+    print("Played {} games in {}s ({} games per minute)".format(len(finished), round(seconds, 3),
+          round(len(finished) * 60 / seconds) if seconds else len(finished)), file=sys.stderr)